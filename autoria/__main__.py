@@ -0,0 +1,72 @@
+import argparse
+
+from autoria.engines import ENGINES, RunConfig
+import envs
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m autoria")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Scrape with one of the engines")
+    run.add_argument("--engine", choices=ENGINES, default="asyncio")
+    run.add_argument(
+        "--db", choices=("postgresql", "mongodb", "sqlite"),
+        default=envs.DB_TYPE
+    )
+    run.add_argument(
+        "--concurrency", type=int,
+        help="Tasks, threads, processes or browser pages in flight"
+    )
+    run.add_argument(
+        "--workers", type=int,
+        help="Parser processes of the hybrid engine, defaults to CPU count"
+    )
+    run.add_argument("--pages", type=int, default=envs.PAGES)
+    run.add_argument(
+        "--headless", action=argparse.BooleanOptionalAction, default=True,
+        help="Run Playwright engines without a browser window"
+    )
+    run.add_argument(
+        "--shared-memory", action="store_true",
+        help="Hand pages to hybrid parser processes through shared memory"
+    )
+
+    export = commands.add_parser(
+        "export", help="Write the car table to date-partitioned files"
+    )
+    export.add_argument(
+        "--db", choices=("postgresql", "mongodb", "sqlite"),
+        default=envs.DB_TYPE
+    )
+    export.add_argument("--output", default="exports")
+    export.add_argument(
+        "--format", choices=("parquet", "arrow"), default="parquet"
+    )
+    export.add_argument("--chunk-size", type=int, default=10000)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.command == "run":
+        ENGINES[args.engine](
+            RunConfig(
+                db_type=args.db,
+                pages=args.pages,
+                concurrency=args.concurrency,
+                workers=args.workers,
+                headless=args.headless,
+                shared_memory=args.shared_memory,
+            )
+        )
+
+    if args.command == "export":
+        from database.export import export_cars
+
+        export_cars(args.db, args.output, args.format, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from database.db_layer import DBType
+import envs
+
+
+@dataclass
+class RunConfig:
+    db_type: DBType = envs.DB_TYPE
+    pages: int = envs.PAGES
+    concurrency: Optional[int] = None
+    workers: Optional[int] = None
+    headless: bool = True
+    shared_memory: bool = False
+
+    def options(self, concurrency_name: str) -> Dict[str, Any]:
+        options = {"pages": self.pages}
+        if self.concurrency is not None:
+            options[concurrency_name] = self.concurrency
+        return options
+
+
+def run_asyncio(config: RunConfig) -> Any:
+    from m_asyncio.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(config.db_type, **config.options("max_tasks"))
+    asyncio.run(scraper.run())
+    return scraper
+
+
+def run_hybrid(config: RunConfig) -> Any:
+    from m_hybrid.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(
+        config.db_type,
+        workers=config.workers,
+        shared_memory=config.shared_memory,
+        **config.options("max_tasks")
+    )
+    asyncio.run(scraper.run())
+    return scraper
+
+
+def run_threads(config: RunConfig) -> Any:
+    from m_threads.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(config.db_type, **config.options("max_threads"))
+    scraper.run()
+    return scraper
+
+
+def run_processes(config: RunConfig) -> Any:
+    from m_processes.run_processes import AutoriaScraper
+
+    scraper = AutoriaScraper(
+        config.db_type, **config.options("max_processes")
+    )
+    scraper.run()
+    return scraper
+
+
+def run_playwright(config: RunConfig) -> Any:
+    from m_playwright_async.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(
+        config.db_type,
+        headless=config.headless,
+        **config.options("max_tasks")
+    )
+    asyncio.run(scraper.run())
+    return scraper
+
+
+def run_playwright_sync(config: RunConfig) -> Any:
+    from m_playwright_sync.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(
+        config.db_type,
+        pages=config.pages,
+        headless=config.headless,
+    )
+    scraper.run()
+    return scraper
+
+
+def run_playwright_threads(config: RunConfig) -> Any:
+    from m_playwright_threads.__main__ import AutoriaScraper
+
+    scraper = AutoriaScraper(
+        config.db_type,
+        headless=config.headless,
+        **config.options("max_threads")
+    )
+    scraper.run()
+    return scraper
+
+
+ENGINES: Dict[str, Callable[[RunConfig], Any]] = {
+    "asyncio": run_asyncio,
+    "hybrid": run_hybrid,
+    "threads": run_threads,
+    "processes": run_processes,
+    "playwright": run_playwright,
+    "playwright_sync": run_playwright_sync,
+    "playwright_threads": run_playwright_threads,
+}
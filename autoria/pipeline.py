@@ -0,0 +1,216 @@
+from urllib.parse import urljoin
+from concurrent.futures import Executor
+from dataclasses import replace
+from threading import Lock
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+import asyncio
+import aiohttp
+
+from database.dal import CarDAL
+from database.db_layer import DBType
+from parsers.parser import LazyCar
+from parsers.registry import UNKNOWN_DESIGN, parser_registry
+from utils.dto import Car, ParseOutcome, ParseResult, ParseStats
+from utils.fetch import (
+    async_get_page,
+    async_iter_list_urls,
+    get_page,
+    iter_list_urls
+)
+from utils.log import get_logger
+from utils.shm import PageDescriptor, read_page
+import envs
+
+
+pipeline_logger = get_logger("Pipeline")
+
+
+class Pipeline:
+    """
+    Stages shared by every engine: fetch -> parse -> dedupe -> sink.
+    Fetch and parse are static so they can run in worker processes,
+    dedupe and sink need the database and stay with the engine.
+    """
+
+    def __init__(self, db_type: DBType) -> None:
+        self.db: CarDAL = CarDAL(db_type)
+        self.seen_vins: Set[str] = set()
+        self.seen_lock = Lock()
+        self.stats = ParseStats()
+        self.stats_lock = Lock()
+
+    @staticmethod
+    def list_page_url(page_number: int) -> str:
+        return urljoin(envs.BASE_URL, f"?page={page_number}")
+
+    @classmethod
+    def iter_urls(cls, page_number: int) -> Iterator[str]:
+        return iter_list_urls(cls.list_page_url(page_number))
+
+    @classmethod
+    def async_iter_urls(
+        cls,
+        page_number: int,
+        session: Optional[aiohttp.ClientSession] = None
+    ) -> AsyncIterator[str]:
+        return async_iter_list_urls(
+            cls.list_page_url(page_number), session=session
+        )
+
+    @staticmethod
+    def fetch(url: str) -> Optional[str]:
+        return get_page(url)
+
+    @staticmethod
+    async def async_fetch(
+        url: str,
+        session: Optional[aiohttp.ClientSession] = None
+    ) -> Optional[str]:
+        return await async_get_page(url, session=session)
+
+    @staticmethod
+    def parse_lazy(
+        html: str,
+        url: str
+    ) -> Tuple[ParseResult, Optional[LazyCar]]:
+        """
+        The outcome so far with the page design, and the car when the
+        page is unsold and has a VIN.
+        """
+        parser = parser_registry.get_parser(html, url)
+        if parser is None:
+            return ParseResult(
+                ParseOutcome.UNKNOWN_DESIGN, design=UNKNOWN_DESIGN
+            ), None
+        outcome, car = parser.try_parse_lazy()
+        return ParseResult(outcome, design=parser.DESIGN), car
+
+    @classmethod
+    def parse(cls, html: str, url: str) -> ParseResult:
+        result, car = cls.parse_lazy(html, url)
+        if car is None:
+            return result
+        return car.try_car()
+
+    @classmethod
+    def parse_vin(cls, html: str, url: str) -> ParseResult:
+        """
+        Stops once the VIN is known, a LazyCar holds the parsed document
+        and cannot leave the worker process.
+        """
+        result, car = cls.parse_lazy(html, url)
+        if car is None:
+            return result
+        return replace(result, car_vin=car.car_vin)
+
+    def record(self, result: ParseResult) -> Optional[Car]:
+        with self.stats_lock:
+            self.stats.add(result.outcome, result.design)
+        return result.car
+
+    def merge_stats(self, stats: ParseStats) -> None:
+        """Adds the stats a worker process collected on its own."""
+        with self.stats_lock:
+            self.stats.update(stats)
+
+    def log_stats(self) -> None:
+        pipeline_logger.info(f"Parse outcomes: {self.stats.summary()}")
+        if self.stats.designs:
+            pipeline_logger.info(
+                f"Page designs: {self.stats.design_summary()}"
+            )
+
+    def is_duplicate(self, car_vin: str) -> bool:
+        # Runs in threads, two pages of one car must not both pass
+        with self.seen_lock:
+            if car_vin in self.seen_vins:
+                return True
+            self.seen_vins.add(car_vin)
+        return self.db.vin_exists(car_vin)
+
+    def parse_unique_lazy(self, html: str, url: str) -> Optional[LazyCar]:
+        """
+        Records pages that are skipped or hold an already seen or saved
+        VIN and returns None for them, otherwise the car whose remaining
+        fields (the phone lookup included) are not extracted yet.
+        """
+        result, car = self.parse_lazy(html, url)
+        if car is None:
+            self.record(result)
+            return None
+        if self.is_duplicate(car.car_vin):
+            self.record(replace(result, outcome=ParseOutcome.DUPLICATE))
+            return None
+        return car
+
+    async def async_parse_unique_lazy(
+        self,
+        html: str,
+        url: str
+    ) -> Optional[LazyCar]:
+        """parse_unique_lazy in a thread, is_duplicate queries the DB."""
+        return await asyncio.to_thread(self.parse_unique_lazy, html, url)
+
+    def parse_unique(self, html: str, url: str) -> Optional[Car]:
+        """
+        Like parse, but drops cars whose VIN was already seen or saved
+        before the phone lookup and the remaining fields are extracted.
+        """
+        car = self.parse_unique_lazy(html, url)
+        if car is None:
+            return None
+        return self.record(car.try_car())
+
+    async def async_parse_unique(self, html: str, url: str) -> Optional[Car]:
+        """
+        parse_unique in a thread, the phone lookup waits on the rate limit
+        and the network, the VIN check on the database.
+        """
+        return await asyncio.to_thread(self.parse_unique, html, url)
+
+    async def async_parse_unique_in(
+        self,
+        executor: Executor,
+        parse_vin: Callable[..., ParseResult],
+        parse: Callable[..., ParseResult],
+        *args: object
+    ) -> Optional[Car]:
+        """
+        parse_unique for pages parsed in a process pool: parse_vin runs
+        first, and only a new VIN gets the full parse with the phone
+        lookup. Both are called with args.
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, parse_vin, *args)
+        if result.car_vin is not None:
+            if await asyncio.to_thread(self.is_duplicate, result.car_vin):
+                result = replace(
+                    result, outcome=ParseOutcome.DUPLICATE, car_vin=None
+                )
+            else:
+                result = await loop.run_in_executor(executor, parse, *args)
+        return self.record(result)
+
+    @staticmethod
+    def read_shared(descriptor: PageDescriptor) -> str:
+        with read_page(descriptor) as body:
+            return str(body, descriptor.encoding or "utf-8", "replace")
+
+    @classmethod
+    def parse_shared(cls, descriptor: PageDescriptor) -> ParseResult:
+        return cls.parse(cls.read_shared(descriptor), descriptor.url)
+
+    @classmethod
+    def parse_vin_shared(cls, descriptor: PageDescriptor) -> ParseResult:
+        return cls.parse_vin(cls.read_shared(descriptor), descriptor.url)
+
+    def sink(self, items: List[Car]) -> None:
+        self.db.process_items(items)
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import requests
+
+from benchmarks.strategies import STRATEGIES
+from mock_server.server import LIST_PATH, PHONES_PATH, STATS_PATH
+from utils.log import get_logger
+
+
+bench_logger = get_logger("Benchmark")
+
+# Strategies clear the task queues, keep them away from the live ones
+BENCH_REDIS_DB = 15
+
+COLUMNS = (
+    ("strategy", "Strategy"),
+    ("concurrency", "Concurrency"),
+    ("wall", "Wall, s"),
+    ("pages_per_sec", "Pages/s"),
+    ("cars_per_sec", "Cars/s"),
+    ("cpu", "CPU, s"),
+    ("peak_rss_mb", "Peak RSS, MB"),
+    ("commits", "DB commits"),
+    ("status", "Status"),
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare runners against the local stand-in site"
+    )
+    parser.add_argument(
+        "--strategies", default=",".join(STRATEGIES),
+        help="Comma separated, any of: " + ", ".join(STRATEGIES)
+    )
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--sold-rate", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=900)
+    parser.add_argument("--output", help="Write the table to this file")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(
+    args: argparse.Namespace,
+    port: int
+) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "mock_server",
+            "--port", str(port),
+            "--pages", str(args.pages),
+            "--per-page", str(args.per_page),
+            "--latency", str(args.latency),
+            "--error-rate", str(args.error_rate),
+            "--sold-rate", str(args.sold_rate),
+        ]
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Mock server did not start")
+
+
+def run_case(
+    strategy: str,
+    concurrency: int,
+    origin: str,
+    args: argparse.Namespace
+) -> Dict:
+    row = {"strategy": strategy, "concurrency": concurrency}
+    stats_url = origin + STATS_PATH
+    requests.delete(stats_url)
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = os.environ.copy()
+        env.update(
+            BASE_URL=origin + LIST_PATH,
+            PHONE_URL=origin + PHONES_PATH,
+            PAGES=str(args.pages),
+            SQLITE_PATH=os.path.join(directory, "bench.sqlite3"),
+            HTTP_CACHE_MODE="off",
+            REDIS_DB=str(BENCH_REDIS_DB),
+        )
+        try:
+            process = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.run_one",
+                    strategy, str(concurrency),
+                    "--stats-url", stats_url,
+                    "--expected-details", str(args.pages * args.per_page),
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=args.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            row["status"] = "timeout"
+            return row
+
+    if process.returncode:
+        error = process.stderr.strip().splitlines()
+        row["status"] = "failed: " + (error[-1] if error else "?")
+        return row
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    row.update(
+        wall=result["wall"],
+        pages_per_sec=result["pages"] / result["wall"],
+        cars_per_sec=result["cars"] / result["wall"],
+        cpu=result["cpu"],
+        peak_rss_mb=result["peak_rss_mb"],
+        commits=result["commits"],
+        status="ok",
+    )
+    return row
+
+
+def format_table(rows: List[Dict]) -> str:
+    def cell(value) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+
+    lines = [
+        "| " + " | ".join(title for _, title in COLUMNS) + " |",
+        "|" + "---|" * len(COLUMNS),
+    ]
+    for row in rows:
+        lines.append(
+            "| "
+            + " | ".join(cell(row.get(key)) for key, _ in COLUMNS)
+            + " |"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = parse_args()
+    port = args.port or free_port()
+    origin = f"http://127.0.0.1:{port}"
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    server = start_mock_server(args, port)
+    rows = []
+    try:
+        for strategy in args.strategies.split(","):
+            concurrent = STRATEGIES[strategy].concurrent
+            for concurrency in levels if concurrent else levels[:1]:
+                bench_logger.info(f"Running {strategy} x{concurrency}")
+                rows.append(run_case(strategy, concurrency, origin, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    table = format_table(rows)
+    print(table)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import time
+from typing import Callable, Dict, Optional
+
+from utils.shm import PageDescriptor, SharedRingBuffer, read_page
+
+
+def make_body(size: int) -> bytes:
+    with open("tests.html", "rb") as file:
+        sample = file.read()
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def consume_bytes(
+    pages: multiprocessing.Queue,
+    done: multiprocessing.Queue
+) -> None:
+    while True:
+        body: Optional[bytes] = pages.get()
+        if body is None:
+            break
+        done.put(len(str(body, "utf-8", "replace")))
+
+
+def consume_descriptors(
+    pages: multiprocessing.Queue,
+    done: multiprocessing.Queue
+) -> None:
+    while True:
+        descriptor: Optional[PageDescriptor] = pages.get()
+        if descriptor is None:
+            break
+        with read_page(descriptor) as body:
+            str(body, descriptor.encoding or "utf-8", "replace")
+        done.put(descriptor.slot)
+
+
+def run_queue(body: bytes, count: int, in_flight: int) -> float:
+    pages, done = multiprocessing.Queue(), multiprocessing.Queue()
+    consumer = multiprocessing.Process(
+        target=consume_bytes, args=(pages, done)
+    )
+    consumer.start()
+
+    start = time.perf_counter()
+    pending = 0
+    for _ in range(count):
+        if pending >= in_flight:
+            done.get()
+            pending -= 1
+        pages.put(body)
+        pending += 1
+    for _ in range(pending):
+        done.get()
+    wall = time.perf_counter() - start
+
+    pages.put(None)
+    consumer.join()
+    return wall
+
+
+def run_shared_memory(body: bytes, count: int, in_flight: int) -> float:
+    ring = SharedRingBuffer(in_flight, len(body))
+    pages, done = multiprocessing.Queue(), multiprocessing.Queue()
+    consumer = multiprocessing.Process(
+        target=consume_descriptors, args=(pages, done)
+    )
+    consumer.start()
+
+    start = time.perf_counter()
+    for _ in range(count):
+        slot = ring.acquire()
+        if slot is None:
+            ring.release(done.get())
+            slot = ring.acquire()
+        ring.write(slot, 0, body)
+        pages.put(
+            PageDescriptor(
+                buffer=ring.name,
+                slot=slot,
+                offset=ring.offset(slot),
+                length=len(body),
+                url="",
+                encoding="utf-8",
+            )
+        )
+    while len(ring.free) < ring.slots:
+        ring.release(done.get())
+    wall = time.perf_counter() - start
+
+    pages.put(None)
+    consumer.join()
+    ring.close()
+    return wall
+
+
+TRANSPORTS: Dict[str, Callable[[bytes, int, int], float]] = {
+    "queue": run_queue,
+    "shared_memory": run_shared_memory,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare page hand-off to a parser process"
+    )
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--size", type=int, default=700 * 1024)
+    parser.add_argument("--in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    body = make_body(args.size)
+    print("| Transport | Wall, s | Pages/s | MB/s |")
+    print("|---|---|---|---|")
+    for name, run in TRANSPORTS.items():
+        wall = run(body, args.pages, args.in_flight)
+        megabytes = args.pages * len(body) / 1024 / 1024
+        print(
+            f"| {name} | {wall:.2f} | {args.pages / wall:.2f} "
+            f"| {megabytes / wall:.2f} |"
+        )
+
+
+if __name__ == "__main__":
+    main()
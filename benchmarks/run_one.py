@@ -0,0 +1,55 @@
+import argparse
+import json
+import resource
+import time
+
+import requests
+
+from benchmarks.strategies import STRATEGIES
+from database import models
+
+
+def count_cars(db) -> int:
+    with db.db.SessionLocal() as session:
+        return session.query(models.Car).count()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("strategy", choices=STRATEGIES)
+    parser.add_argument("concurrency", type=int)
+    parser.add_argument("--stats-url", required=True)
+    parser.add_argument("--expected-details", type=int, required=True)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    databases = STRATEGIES[args.strategy].run(
+        args.concurrency, args.stats_url, args.expected_details
+    )
+    wall = time.perf_counter() - started
+
+    usage = [
+        resource.getrusage(resource.RUSAGE_SELF),
+        resource.getrusage(resource.RUSAGE_CHILDREN),
+    ]
+    served = requests.get(args.stats_url).json()
+
+    print(
+        json.dumps(
+            {
+                "wall": wall,
+                "pages": (
+                    served.get("list_pages", 0)
+                    + served.get("detail_pages", 0)
+                ),
+                "cars": count_cars(databases[0]),
+                "cpu": sum(item.ru_utime + item.ru_stime for item in usage),
+                "peak_rss_mb": max(item.ru_maxrss for item in usage) / 1024,
+                "commits": sum(db.db.commits for db in databases),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from autoria.engines import ENGINES, RunConfig
+from database.db_layer import DBInterface
+from utils.cache import Cache
+from utils.task_queue import (
+    DONE_QUEUE, FAILED_QUEUE, RESULTS_QUEUE, TASKS_QUEUE
+)
+import envs
+
+
+# A run returns every database it wrote through, the first holds the cars
+RunStrategy = Callable[[int, str, int], List[DBInterface]]
+
+
+@dataclass
+class Strategy:
+    name: str
+    run: RunStrategy
+    concurrent: bool = True
+
+
+def run_engine(engine: str, **options: Any) -> RunStrategy:
+    def run(
+        concurrency: int,
+        stats_url: str,
+        expected: int
+    ) -> List[DBInterface]:
+        scraper = ENGINES[engine](
+            RunConfig(db_type="sqlite", concurrency=concurrency, **options)
+        )
+        return [scraper.db.db]
+
+    return run
+
+
+def run_orchestrator(
+    concurrency: int,
+    stats_url: str,
+    expected: int
+) -> List[DBInterface]:
+    """
+    Runs the Orchestrator loop in this process against `concurrency` worker
+    processes until the stand-in site has served every detail page.
+    """
+    from m_orchestrator.__main__ import Orchestrator
+
+    cache = Cache(envs.REDIS_DB)
+    cache.red.delete(TASKS_QUEUE, RESULTS_QUEUE, DONE_QUEUE, FAILED_QUEUE)
+
+    orchestrator = Orchestrator("sqlite")
+    orchestrator.reset_tasks_status()
+
+    workers: List[subprocess.Popen] = [
+        subprocess.Popen(
+            [sys.executable, "-m", "m_worker"],
+            env=os.environ.copy(),
+        )
+        for _ in range(concurrency)
+    ]
+    try:
+        while True:
+            orchestrator.reap_tasks()
+            orchestrator.schedule_tasks()
+            orchestrator.get_tasks()
+            orchestrator.pass_tasks()
+            orchestrator.get_results()
+            orchestrator.save_results()
+            orchestrator.complete_tasks()
+            orchestrator.fail_tasks()
+
+            served = requests.get(stats_url).json().get("detail_pages", 0)
+            if served >= expected and not cache.red.llen(RESULTS_QUEUE):
+                break
+            time.sleep(0.5)
+
+        time.sleep(2)
+        orchestrator.get_results()
+        orchestrator.save_results()
+        orchestrator.complete_tasks()
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+        cache.red.delete(
+            TASKS_QUEUE, RESULTS_QUEUE, DONE_QUEUE, FAILED_QUEUE
+        )
+
+    return [orchestrator.result_dal.db, orchestrator.task_dal.db]
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    strategy.name: strategy
+    for strategy in (
+        *(
+            Strategy(engine, run_engine(engine))
+            for engine in ENGINES
+            if engine != "playwright_sync"
+        ),
+        Strategy(
+            "playwright_sync",
+            run_engine("playwright_sync"),
+            concurrent=False
+        ),
+        Strategy("hybrid_shm", run_engine("hybrid", shared_memory=True)),
+        Strategy("orchestrator", run_orchestrator),
+    )
+}
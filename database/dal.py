@@ -1,62 +1,141 @@
-from typing import List, Literal
+import threading
+from typing import Any, Collection, Iterable, Iterator, List, Optional
 
 from utils import dto
-from utils.log import get_logger
-from database.db_layer import DBInterface
+from utils.bloom import VinFilter, get_vin_filter
+from utils.log import RateLimitedLog, get_logger
+from database.db_layer import DBInterface, DBType
 
 
 db_logger = get_logger("Database")
+duplicate_warning = RateLimitedLog(db_logger)
+
+VIN_CHUNK = 10000
 
 
 class DAL:
-    def __init__(self, db_type: Literal["postgresql", "mongodb"]) -> None:
+    def __init__(self, db_type: DBType) -> None:
         self.db: DBInterface = DBInterface(db_type)
 
 
-class CarDAL(DAL):
+class VinDAL(DAL):
+    """
+    DAL that writes cars. Duplicate checks go through the VIN Bloom
+    filter (BLOOM_ENABLED) first, only possible duplicates reach the DB.
+    """
+
+    def __init__(self, db_type: DBType) -> None:
+        super().__init__(db_type)
+        self.vins: Optional[VinFilter] = get_vin_filter()
+        if self.vins is not None:
+            threading.Thread(
+                target=self.vins.warm,
+                args=(self.iter_vins,),
+                name="bloom-warm",
+                daemon=True,
+            ).start()
+
+    def iter_vins(self) -> Iterator[List[str]]:
+        return self.db.iter_vins(VIN_CHUNK)
+
+    def might_exist(self, vin: str) -> bool:
+        return self.vins is None or self.vins.might_contain(vin)
+
+    def vin_exists(self, vin: str) -> bool:
+        return (
+            self.might_exist(vin)
+            and self.db.get_car_by_vin(vin) is not None
+        )
+
+    def remember_vins(self, vins: List[str]) -> None:
+        if self.vins is not None and vins:
+            self.vins.add(vins)
+
+
+class CarDAL(VinDAL):
     def process_items(self, items: List[dto.Car]):
         if not items:
-            pass
+            return
 
-        for item in items:
-            if self.db.get_car_by_vin(item.car_vin):
-                db_logger.warning(
-                    "Item already in database. Vin: %s" % item.car_vin
-                )
-                continue
-            self.db.add_car(item)
+        added = []
+        with self.db.unit_of_work() as uow:
+            for item in items:
+                # A stale filter can miss a VIN, the insert still
+                # conflicts inside its savepoint
+                if (
+                    self.might_exist(item.car_vin)
+                    and uow.get_car_by_vin(item.car_vin)
+                ) or uow.add_car(item) is None:
+                    duplicate_warning(
+                        "duplicate",
+                        "Item already in database. Vin: %s" % item.car_vin
+                    )
+                    continue
+                added.append(item.car_vin)
+        self.remember_vins(added)
 
 
 class TaskDAL(DAL):
-    def reset_tasks_status(self) -> None:
+    def reset_tasks_status(self, keep: Collection[Any] = ()) -> None:
+        """Sets unfinished tasks idle again, except the ids in keep."""
         db_logger.info("Resetting unfinished tasks")
-        self.db.reset_tasks_status()
+        self.db.reset_tasks_status(keep)
+
+    def create_tasks(self, cycle: int, page_numbers: Iterable[int]) -> int:
+        added = self.db.add_tasks(
+            [
+                dto.CreateTask(page_number=page_number, cycle=cycle)
+                for page_number in page_numbers
+            ]
+        )
+        db_logger.info(f"Created {added} tasks in cycle {cycle}")
+        return added
+
+    def get_cycle_state(self) -> Optional[dto.CycleState]:
+        return self.db.get_cycle_state()
+
+    def mark_empty(self, task_id: int) -> Optional[int]:
+        """
+        Completes an empty page and every later page of its cycle,
+        returns the page number.
+        """
+        task = self.db.get_task_by_id(task_id)
+        if task is None:
+            return None
+
+        self.db.update_task(task, empty=True, completed=True)
+        self.db.close_tasks_after(task.cycle, task.page_number)
+        return task.page_number
+
+    def delete_cycles_before(self, cycle: int) -> None:
+        deleted = self.db.delete_cycles_before(cycle)
+        if deleted:
+            db_logger.info(f"Deleted {deleted} tasks before cycle {cycle}")
+
+    def complete_tasks(self, task_ids: List[int]) -> None:
+        if not task_ids:
+            return
 
-    def create_tasks(self) -> None:
-        db_logger.info("Creating new tasks")
-        tasks = [
-            dto.CreateTask(page_number=i)
-            for i in range(1, 11)
-        ]
-        self.db.bulk_save_tasks(tasks)
+        db_logger.info(f"Completing {len(task_ids)} tasks")
+        with self.db.unit_of_work() as uow:
+            for task_id in task_ids:
+                uow.complete_task(task_id)
 
     def get_tasks(self, limit: int) -> List[dto.Task]:
         db_logger.info("Getting tasks from DataBase")
-        result = []
-        for item in self.db.get_idle_tasks(limit):
-            task = dto.Task(
-                item.id,
-                item.page_number,
-                item.in_work,
-                item.completed
-            )
-            self.db.update_task(item, in_work=True)
-            result.append(task)
+        # Read the whole batch first, the cursor is closed before updates
+        result = [
+            task
+            for tasks in self.db.iter_idle_tasks(limit, limit)
+            for task in tasks
+        ]
+        for task in result:
+            self.db.update_task(task, in_work=True)
 
         return result
 
 
-class ResultDAL(DAL):
+class ResultDAL(VinDAL):
     def save_results(self, items: List[dto.Result]) -> None:
         if not items:
             return
@@ -64,29 +143,45 @@ class ResultDAL(DAL):
         db_logger.info("Saving results into DataBase")
 
         existing_vins = []
-
-        for item in items:
-            db_car = self.db.get_car_by_vin(item.car.car_vin)
-            if db_car:
-                db_logger.warning(
-                    "Item already in database. Vin: %s" % item.car.car_vin
+        added = []
+
+        with self.db.unit_of_work() as uow:
+            for item in items:
+                db_car = None
+                if self.might_exist(item.car.car_vin):
+                    db_car = uow.get_car_by_vin(item.car.car_vin)
+                if db_car:
+                    duplicate_warning(
+                        "duplicate",
+                        "Item already in database. Vin: %s" % item.car.car_vin
+                    )
+                elif item.car.car_vin in existing_vins:
+                    duplicate_warning(
+                        "duplicate",
+                        "Item already in database. Vin: %s" % item.car.car_vin
+                    )
+                    continue
+                else:
+                    db_car = uow.add_car(item.car)
+                    if db_car is None:
+                        db_logger.warning(
+                            "Item inserted concurrently. Vin: %s"
+                            % item.car.car_vin
+                        )
+                        db_car = uow.get_car_by_vin(item.car.car_vin)
+                        if not db_car:
+                            continue
+                    else:
+                        added.append(item.car.car_vin)
+
+                existing_vins.append(item.car.car_vin)
+
+                uow.add_result(
+                    dto.CreateResult(
+                        task_id=item.task_id,
+                        car_id=db_car.id
+                    )
                 )
-            elif item.car.car_vin in existing_vins:
-                db_logger.warning(
-                    "Item already in database. Vin: %s" % item.car.car_vin
-                )
-                continue
-            else:
-                db_car = self.db.add_car(item.car)
-
-            existing_vins.append(item.car.car_vin)
-
-            result = dto.CreateResult(
-                task_id=item.task_id,
-                car_id=db_car.id
-            )
-            self.db.add_result(result)
-            self.db.update_task(
-                self.db.get_task_by_id(item.task_id),
-                completed=True
-            )
+                uow.complete_task(item.task_id)
+
+        self.remember_vins(added)
@@ -1,34 +1,68 @@
 import abc
-from dataclasses import asdict
+from contextlib import contextmanager
+from dataclasses import asdict, fields
 from datetime import datetime
-import os
-import sys
-from typing import Literal, Optional, Union, List
-from sqlalchemy import create_engine, and_
-from sqlalchemy.orm import sessionmaker
+from typing import (
+    Any, Collection, Iterator, Literal, Optional, Union, List, Set
+)
+from sqlalchemy import create_engine, and_, event, func, select
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.sql import Select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, Session
 from mongoengine import connect
+from mongoengine.errors import NotUniqueError
 
 from utils.log import get_logger
 from database import models, mongo_models
+from database.schema import upgrade_mongo, upgrade_sql
 from utils import dto
 import envs
 
 
 db_logger = get_logger("DB")
 
+CAR_FIELDS = [field.name for field in fields(dto.Car)]
+TASK_FIELDS = [field.name for field in fields(dto.Task)]
+
+DBType = Literal["postgresql", "mongodb", "sqlite"]
+
 
 def get_db_class(
-    db_type: Literal["postgresql", "mongodb"]
-) -> Optional[Union["PostgreSQL", "MongoDB"]]:
+    db_type: DBType
+) -> Optional[Union["PostgreSQL", "MongoDB", "SQLite"]]:
     if db_type == "postgresql":
         return PostgreSQL
 
     if db_type == "mongodb":
         return MongoDB
 
+    if db_type == "sqlite":
+        return SQLite
+
     return None
 
 
+class UnitOfWorkABC(abc.ABC):
+
+    @abc.abstractmethod
+    def get_car_by_vin(self, vin: str) -> Optional[models.Car]:
+        pass
+
+    @abc.abstractmethod
+    def add_car(self, object: dto.Car) -> Optional[models.Car]:
+        """Insert a car inside a savepoint, returns None on conflict."""
+        pass
+
+    @abc.abstractmethod
+    def add_result(self, object: dto.CreateResult) -> None:
+        pass
+
+    @abc.abstractmethod
+    def complete_task(self, task_id: int) -> None:
+        pass
+
+
 class DatabaseABC(abc.ABC):
 
     @abc.abstractmethod
@@ -57,7 +91,25 @@ class DatabaseABC(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def reset_tasks_status(self) -> None:
+    def add_tasks(self, objects: List[dto.CreateTask]) -> int:
+        """Insert tasks one by one, skipping existing (cycle, page)."""
+        pass
+
+    @abc.abstractmethod
+    def get_cycle_state(self) -> Optional[dto.CycleState]:
+        """Frontier, empty page boundary and progress of the last cycle."""
+        pass
+
+    @abc.abstractmethod
+    def close_tasks_after(self, cycle: int, page_number: int) -> None:
+        pass
+
+    @abc.abstractmethod
+    def delete_cycles_before(self, cycle: int) -> int:
+        pass
+
+    @abc.abstractmethod
+    def reset_tasks_status(self, keep: Collection[Any] = ()) -> None:
         pass
 
     @abc.abstractmethod
@@ -93,23 +145,91 @@ class DatabaseABC(abc.ABC):
     def get_task_by_id(self, id: int) -> models.Task:
         pass
 
+    @abc.abstractmethod
+    def unit_of_work(self) -> Iterator[UnitOfWorkABC]:
+        pass
+
+    @abc.abstractmethod
+    def iter_cars(
+        self,
+        chunk_size: int,
+        since: Optional[datetime] = None,
+        order_by: str = "id"
+    ) -> Iterator[List[dto.Car]]:
+        pass
+
+    @abc.abstractmethod
+    def iter_vins(self, chunk_size: int) -> Iterator[List[str]]:
+        pass
+
+    @abc.abstractmethod
+    def iter_idle_tasks(
+        self,
+        chunk_size: int,
+        limit: Optional[int] = None
+    ) -> Iterator[List[dto.Task]]:
+        pass
+
+
+class PostgreSQLUnitOfWork(UnitOfWorkABC):
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.completed_tasks: Set[int] = set()
+
+    def get_car_by_vin(self, vin: str) -> Optional[models.Car]:
+        return self.session.query(models.Car).filter(
+            models.Car.car_vin == vin
+        ).first()
+
+    def add_car(self, object: dto.Car) -> Optional[models.Car]:
+        car = models.Car(**asdict(object))
+        try:
+            with self.session.begin_nested():
+                self.session.add(car)
+        except IntegrityError:
+            return None
+        return car
+
+    def add_result(self, object: dto.CreateResult) -> None:
+        self.session.add(models.Result(**asdict(object)))
+
+    def complete_task(self, task_id: int) -> None:
+        self.completed_tasks.add(task_id)
+
+    def commit(self) -> None:
+        if self.completed_tasks:
+            self.session.query(models.Task).filter(
+                models.Task.id.in_(self.completed_tasks)
+            ).update({"completed": True}, synchronize_session=False)
+        self.session.commit()
+
 
 class PostgreSQL(DatabaseABC):
 
     def __init__(self) -> None:
-        self.engine = create_engine(
-            (
-                f"postgresql://{envs.POSTGRES_USER}:{envs.POSTGRES_PASSWORD}"
-                f"@{envs.POSTGRES_HOST}/{envs.POSTGRES_DB}"
-            )
-        )
+        self.engine = self.make_engine()
+        self.commits = 0
+        event.listen(self.engine, "commit", self.count_commit)
         self.SessionLocal = sessionmaker(
             autocommit=False,
             autoflush=False,
             bind=self.engine
         )
+        upgrade_sql(self.engine)
         models.Base.metadata.create_all(self.engine)
 
+    def make_engine(self) -> Engine:
+        return create_engine(
+            (
+                f"postgresql://{envs.POSTGRES_USER}:{envs.POSTGRES_PASSWORD}"
+                f"@{envs.POSTGRES_HOST}/{envs.POSTGRES_DB}"
+            )
+        )
+
+    def count_commit(self, connection) -> None:
+        self.commits += 1
+
     def get_car_by_vin(self, vin: str) -> Optional[models.Car]:
         with self.SessionLocal() as db:
             return db.query(models.Car).filter(
@@ -155,11 +275,69 @@ class PostgreSQL(DatabaseABC):
             )
             db.commit()
 
-    def reset_tasks_status(self) -> None:
+    def add_tasks(self, objects: List[dto.CreateTask]) -> int:
+        added = 0
+        with self.SessionLocal() as db:
+            for object in objects:
+                try:
+                    with db.begin_nested():
+                        db.add(models.Task(**asdict(object)))
+                except IntegrityError:
+                    continue
+                added += 1
+            db.commit()
+        return added
+
+    def get_cycle_state(self) -> Optional[dto.CycleState]:
+        with self.SessionLocal() as db:
+            cycle = db.query(func.max(models.Task.cycle)).scalar()
+            if cycle is None:
+                return None
+
+            in_cycle = models.Task.cycle == cycle
+            frontier, started = db.query(
+                func.max(models.Task.page_number),
+                func.min(models.Task.created_at)
+            ).filter(in_cycle).one()
+            boundary = db.query(func.min(models.Task.page_number)).filter(
+                in_cycle, models.Task.empty == True  # noqa
+            ).scalar()
+            open_tasks = db.query(models.Task).filter(
+                in_cycle, models.Task.completed == False  # noqa
+            ).count()
+
+            return dto.CycleState(
+                cycle, frontier, boundary, open_tasks, started
+            )
+
+    def close_tasks_after(self, cycle: int, page_number: int) -> None:
+        with self.SessionLocal() as db:
+            db.query(models.Task).filter(
+                models.Task.cycle == cycle,
+                models.Task.page_number > page_number
+            ).update({"completed": True}, synchronize_session=False)
+            db.commit()
+
+    def delete_cycles_before(self, cycle: int) -> int:
+        with self.SessionLocal() as db:
+            # Tables created before task_id had ON DELETE SET NULL keep
+            # the old constraint, create_all does not alter it
+            old_tasks = select(models.Task.id).where(models.Task.cycle < cycle)
+            db.query(models.Result).filter(
+                models.Result.task_id.in_(old_tasks)
+            ).update({"task_id": None}, synchronize_session=False)
+            deleted = db.query(models.Task).filter(
+                models.Task.cycle < cycle
+            ).delete(synchronize_session=False)
+            db.commit()
+        return deleted
+
+    def reset_tasks_status(self, keep: Collection[Any] = ()) -> None:
         with self.SessionLocal() as db:
             db.query(models.Task).filter(
-                and_(models.Task.in_work == True, models.Task.completed == False)  # noqa
-            ).update({"in_work": False})
+                and_(models.Task.in_work == True, models.Task.completed == False),  # noqa
+                models.Task.id.notin_(keep)
+            ).update({"in_work": False}, synchronize_session=False)
             db.commit()
 
     def get_idle_tasks(self, limit: int) -> List[models.Task]:
@@ -169,6 +347,8 @@ class PostgreSQL(DatabaseABC):
                     models.Task.in_work == False,  # noqa
                     models.Task.completed == False  # noqa
                 )
+            ).order_by(
+                models.Task.cycle, models.Task.page_number
             ).limit(limit).all()
 
     def update_task(self, task: dto.Task, **kwargs) -> models.Task:
@@ -219,21 +399,126 @@ class PostgreSQL(DatabaseABC):
                 models.Task.id == id
             ).first()
 
+    @contextmanager
+    def unit_of_work(self) -> Iterator[PostgreSQLUnitOfWork]:
+        with self.SessionLocal() as db:
+            uow = PostgreSQLUnitOfWork(db)
+            try:
+                yield uow
+                uow.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+    def iter_cars(
+        self,
+        chunk_size: int,
+        since: Optional[datetime] = None,
+        order_by: str = "id"
+    ) -> Iterator[List[dto.Car]]:
+        """
+        Streams the car table (found after `since`, if given) in chunks,
+        sorted by the `order_by` column.
+        """
+        query = select(
+            *(getattr(models.Car, name) for name in CAR_FIELDS)
+        ).order_by(getattr(models.Car, order_by), models.Car.id)
+        if since is not None:
+            query = query.where(models.Car.datetime_found > since)
+
+        for rows in self.stream(query, chunk_size):
+            yield [dto.Car(*row) for row in rows]
+
+    def iter_vins(self, chunk_size: int) -> Iterator[List[str]]:
+        query = select(models.Car.car_vin).order_by(models.Car.id)
+        for rows in self.stream(query, chunk_size):
+            yield [row[0] for row in rows]
+
+    def iter_idle_tasks(
+        self,
+        chunk_size: int,
+        limit: Optional[int] = None
+    ) -> Iterator[List[dto.Task]]:
+        query = select(
+            *(getattr(models.Task, name) for name in TASK_FIELDS)
+        ).where(
+            models.Task.in_work == False,  # noqa
+            models.Task.completed == False  # noqa
+        ).order_by(
+            models.Task.cycle, models.Task.page_number
+        ).limit(limit)
+
+        for rows in self.stream(query, chunk_size):
+            yield [dto.Task(*row) for row in rows]
+
+    def stream(self, query: Select, chunk_size: int) -> Iterator[List[Row]]:
+        """
+        Runs the query through a server-side cursor, only one chunk of
+        rows is held in memory.
+        """
+        with self.engine.connect() as connection:
+            result = connection.execution_options(
+                yield_per=chunk_size
+            ).execute(query)
+            yield from result.partitions()
+
+
+class SQLite(PostgreSQL):
+
+    def make_engine(self) -> Engine:
+        engine = create_engine(f"sqlite:///{envs.SQLITE_PATH}")
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "begin", self.on_begin)
+        return engine
+
     @staticmethod
-    def create_database_dump() -> None:
-        timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-        file_path = os.path.join("dumps", f"dump_{timestamp}")
-        command = (
-            f"pg_dump --no-owner --dbname=postgresql://{envs.POSTGRES_USER}"
-            f":{envs.POSTGRES_PASSWORD}@{envs.POSTGRES_HOST}:"
-            f"{envs.POSTGRES_PORT}/{envs.POSTGRES_DB} > {file_path}"
-        )
-        code = os.system(command)
-        if code:
-            db_logger.error(
-                f"Error dumping database: code - {code}, command - {command}"
+    def on_connect(connection, record) -> None:
+        # pysqlite opens transactions itself and lazily, which breaks
+        # SAVEPOINT, so it is switched off and on_begin emits BEGIN
+        connection.isolation_level = None
+        # SQLite ignores ON DELETE SET NULL unless asked per connection
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    @staticmethod
+    def on_begin(connection) -> None:
+        connection.exec_driver_sql("BEGIN")
+
+
+class MongoDBUnitOfWork(UnitOfWorkABC):
+
+    def __init__(self) -> None:
+        self.results: List[mongo_models.Result] = []
+        self.completed_tasks: Set[str] = set()
+
+    def get_car_by_vin(self, vin: str) -> Optional[mongo_models.Car]:
+        return mongo_models.Car.objects(car_vin=vin).first()
+
+    def add_car(self, object: dto.Car) -> Optional[mongo_models.Car]:
+        car = mongo_models.Car(**asdict(object))
+        try:
+            car.save(force_insert=True)
+        except NotUniqueError:
+            return None
+        return car
+
+    def add_result(self, object: dto.CreateResult) -> None:
+        self.results.append(
+            mongo_models.Result(
+                task=mongo_models.Task(id=object.task_id),
+                car=mongo_models.Car(id=object.car_id)
             )
-            sys.exit(10)
+        )
+
+    def complete_task(self, task_id: str) -> None:
+        self.completed_tasks.add(task_id)
+
+    def commit(self) -> None:
+        if self.results:
+            mongo_models.Result.objects.insert(self.results, load_bulk=False)
+        if self.completed_tasks:
+            mongo_models.Task.objects(
+                id__in=list(self.completed_tasks)
+            ).update(completed=True)
 
 
 class MongoDB(DatabaseABC):
@@ -242,6 +527,7 @@ class MongoDB(DatabaseABC):
         connect(
             host=envs.MONGO_URI
         )
+        upgrade_mongo()
 
     def get_car_by_vin(self, vin: str) -> Optional[mongo_models.Car]:
         return mongo_models.Car.objects(car_vin=vin).first()
@@ -286,15 +572,48 @@ class MongoDB(DatabaseABC):
             ]
         )
 
-    def reset_tasks_status(self) -> None:
+    def add_tasks(self, objects: List[dto.CreateTask]) -> int:
+        added = 0
+        for object in objects:
+            try:
+                mongo_models.Task(**asdict(object)).save(force_insert=True)
+            except NotUniqueError:
+                continue
+            added += 1
+        return added
+
+    def get_cycle_state(self) -> Optional[dto.CycleState]:
+        last = mongo_models.Task.objects.order_by("-cycle").first()
+        if last is None:
+            return None
+
+        tasks = mongo_models.Task.objects(cycle=last.cycle)
+        empty = tasks(empty=True).order_by("page_number").first()
+        return dto.CycleState(
+            cycle=last.cycle,
+            frontier=tasks.order_by("-page_number").first().page_number,
+            boundary=empty.page_number if empty else None,
+            open_tasks=tasks(completed=False).count(),
+            started=tasks.order_by("created_at").first().created_at,
+        )
+
+    def close_tasks_after(self, cycle: int, page_number: int) -> None:
+        mongo_models.Task.objects(
+            cycle=cycle, page_number__gt=page_number
+        ).update(completed=True)
+
+    def delete_cycles_before(self, cycle: int) -> int:
+        return mongo_models.Task.objects(cycle__lt=cycle).delete()
+
+    def reset_tasks_status(self, keep: Collection[Any] = ()) -> None:
         mongo_models.Task.objects(
-            in_work=True, completed=False
+            in_work=True, completed=False, id__nin=list(keep)
         ).update(in_work=False)
 
     def get_idle_tasks(self, limit: int) -> List[mongo_models.Task]:
         return mongo_models.Task.objects(
             in_work=False, completed=False
-        ).limit(limit).all()
+        ).order_by("cycle", "page_number").limit(limit).all()
 
     def update_task(self, task: dto.Task, **kwargs) -> mongo_models.Task:
         mongo_models.Task.objects(id=task.id).update_one(**kwargs)
@@ -331,23 +650,81 @@ class MongoDB(DatabaseABC):
     def get_task_by_id(self, id: int) -> mongo_models.Task:
         return mongo_models.Task.objects(id=id).first()
 
+    @contextmanager
+    def unit_of_work(self) -> Iterator[MongoDBUnitOfWork]:
+        uow = MongoDBUnitOfWork()
+        yield uow
+        uow.commit()
+
+    def iter_cars(
+        self,
+        chunk_size: int,
+        since: Optional[datetime] = None,
+        order_by: str = "id"
+    ) -> Iterator[List[dto.Car]]:
+        query = mongo_models.Car.objects
+        if since is not None:
+            query = query(datetime_found__gt=since)
+
+        # Sorting by a field without an index may exceed the server's
+        # in-memory sort limit
+        cursor = query.order_by(order_by, "id").allow_disk_use(
+            True
+        ).only(*CAR_FIELDS).as_pymongo()
+        for documents in self.stream(cursor, chunk_size):
+            yield [
+                dto.Car(**{name: document.get(name) for name in CAR_FIELDS})
+                for document in documents
+            ]
+
+    def iter_vins(self, chunk_size: int) -> Iterator[List[str]]:
+        cursor = mongo_models.Car.objects.order_by("id").only(
+            "car_vin"
+        ).as_pymongo()
+        for documents in self.stream(cursor, chunk_size):
+            yield [document["car_vin"] for document in documents]
+
+    def iter_idle_tasks(
+        self,
+        chunk_size: int,
+        limit: Optional[int] = None
+    ) -> Iterator[List[dto.Task]]:
+        cursor = mongo_models.Task.objects(
+            in_work=False, completed=False
+        ).order_by("cycle", "page_number").only(*TASK_FIELDS).as_pymongo()
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        for documents in self.stream(cursor, chunk_size):
+            yield [
+                dto.Task(
+                    id=document["_id"],
+                    **{
+                        name: document.get(name)
+                        for name in TASK_FIELDS if name != "id"
+                    }
+                )
+                for document in documents
+            ]
+
     @staticmethod
-    def create_database_dump() -> None:
-        timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-        file_path = os.path.join("dumps", f"dump_{timestamp}")
-        command = (
-            f"mongodump --uri={envs.MONGO_URI} --out {file_path}"
-        )
-        code = os.system(command)
-        if code:
-            db_logger.error(
-                f"Error dumping database: code - {code}, command - {command}"
-            )
-            sys.exit(10)
+    def stream(cursor: Any, chunk_size: int) -> Iterator[List[dict]]:
+        """
+        Reads the cursor `chunk_size` documents per round trip and
+        yields them in chunks of that size.
+        """
+        chunk: List[dict] = []
+        for document in cursor.batch_size(chunk_size):
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
 
 class DBInterface(DatabaseABC):
-    def __init__(self, db_type: Literal["postgresql", "mongodb"]) -> None:
+    def __init__(self, db_type: DBType) -> None:
         self.db_type = db_type
         self.db: Optional[Union[PostgreSQL, MongoDB]] = get_db_class(db_type)()
         assert self.db is not None
@@ -373,8 +750,20 @@ class DBInterface(DatabaseABC):
     ) -> None:
         return self.db.bulk_save_results(objects)
 
-    def reset_tasks_status(self) -> None:
-        return self.db.reset_tasks_status()
+    def add_tasks(self, objects: List[dto.CreateTask]) -> int:
+        return self.db.add_tasks(objects)
+
+    def get_cycle_state(self) -> Optional[dto.CycleState]:
+        return self.db.get_cycle_state()
+
+    def close_tasks_after(self, cycle: int, page_number: int) -> None:
+        return self.db.close_tasks_after(cycle, page_number)
+
+    def delete_cycles_before(self, cycle: int) -> int:
+        return self.db.delete_cycles_before(cycle)
+
+    def reset_tasks_status(self, keep: Collection[Any] = ()) -> None:
+        return self.db.reset_tasks_status(keep)
 
     def get_idle_tasks(self, limit: int) -> List[models.Task]:
         return self.db.get_idle_tasks(limit)
@@ -403,5 +792,28 @@ class DBInterface(DatabaseABC):
     def get_task_by_id(self, id: int) -> models.Task:
         return self.db.get_task_by_id(id)
 
+    def unit_of_work(self) -> Iterator[UnitOfWorkABC]:
+        return self.db.unit_of_work()
+
+    def iter_cars(
+        self,
+        chunk_size: int,
+        since: Optional[datetime] = None,
+        order_by: str = "id"
+    ) -> Iterator[List[dto.Car]]:
+        return self.db.iter_cars(chunk_size, since, order_by)
+
+    def iter_vins(self, chunk_size: int) -> Iterator[List[str]]:
+        return self.db.iter_vins(chunk_size)
+
+    def iter_idle_tasks(
+        self,
+        chunk_size: int,
+        limit: Optional[int] = None
+    ) -> Iterator[List[dto.Task]]:
+        return self.db.iter_idle_tasks(chunk_size, limit)
+
     def create_database_dump(self) -> None:
-        self.db.create_database_dump()
+        from database.dumps import DumpManager
+
+        DumpManager(self.db_type).dump_full()
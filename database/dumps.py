@@ -0,0 +1,240 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import BinaryIO, Iterator, List, Optional
+
+from database.db_layer import DBInterface, DBType
+from utils.exceptions import DumpException
+from utils.log import get_logger
+import envs
+
+
+dump_logger = get_logger("Dumps")
+
+FULL_PREFIX = "full_"
+INCREMENTAL_PREFIX = "cars_"
+TIMESTAMP_FORMAT = "%Y_%m_%d_%H_%M_%S"
+COPY_BUFFER = 64 * 1024
+CHUNK_SIZE = 10000
+# Cars are stamped when parsed, not when committed, so every incremental
+# dump re-reads a short window before the watermark. Overlapping rows
+# share a VIN and collapse on restore.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+class DumpManager:
+    """
+    Full dumps (pg_dump, mongodump or SQLite iterdump) once a day at
+    DUMP_HOUR:DUMP_MINUTE and incremental JSON lines dumps of cars found
+    since the last watermark every DUMP_INTERVAL seconds. Everything is
+    gzip-compressed while it streams to disk, start() runs the schedule
+    in a background thread.
+    """
+
+    def __init__(
+        self,
+        db_type: DBType,
+        directory: str = envs.DUMP_DIR,
+        keep: int = envs.DUMP_KEEP,
+        interval: int = envs.DUMP_INTERVAL,
+    ) -> None:
+        self.db_type = db_type
+        self.directory = directory
+        self.keep = keep
+        self.interval = interval
+        self.watermark_path = os.path.join(directory, "watermark.json")
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @cached_property
+    def db(self) -> DBInterface:
+        return DBInterface(self.db_type)
+
+    def command(self) -> Optional[List[str]]:
+        if self.db_type == "postgresql":
+            return [
+                "pg_dump", "--no-owner",
+                (
+                    f"--dbname=postgresql://{envs.POSTGRES_USER}"
+                    f":{envs.POSTGRES_PASSWORD}@{envs.POSTGRES_HOST}:"
+                    f"{envs.POSTGRES_PORT}/{envs.POSTGRES_DB}"
+                ),
+            ]
+        if self.db_type == "mongodb":
+            return ["mongodump", f"--uri={envs.MONGO_URI}", "--archive"]
+        return None
+
+    def new_path(self, prefix: str, extension: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        return os.path.join(self.directory, f"{prefix}{timestamp}{extension}")
+
+    def list_dumps(self, prefix: str) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(prefix) and name.endswith(".gz")
+        )
+
+    @contextmanager
+    def open_dump(self, path: str) -> Iterator[BinaryIO]:
+        partial = path + ".partial"
+        try:
+            with gzip.open(partial, "wb") as file:
+                yield file
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def write_command(self, command: List[str], file: BinaryIO) -> None:
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=stderr
+            )
+            shutil.copyfileobj(process.stdout, file, COPY_BUFFER)
+            code = process.wait()
+            if code:
+                stderr.seek(0)
+                raise DumpException(
+                    f"{command[0]} exited with {code}: "
+                    f"{stderr.read().decode(errors='replace').strip()}"
+                )
+
+    def write_sqlite(self, file: BinaryIO) -> None:
+        with sqlite3.connect(envs.SQLITE_PATH) as connection:
+            for line in connection.iterdump():
+                file.write(line.encode() + b"\n")
+
+    def dump_full(self) -> Optional[str]:
+        command = self.command()
+        extension = ".archive.gz" if self.db_type == "mongodb" else ".sql.gz"
+        path = self.new_path(FULL_PREFIX, extension)
+        started = datetime.now()
+
+        dump_logger.info(f"Starting full dump into {path}")
+        try:
+            with self.open_dump(path) as file:
+                if command is None:
+                    self.write_sqlite(file)
+                else:
+                    self.write_command(command, file)
+        except (OSError, sqlite3.Error, DumpException) as e:
+            dump_logger.error(f"Full dump failed: {e}")
+            return None
+
+        self.save_watermark(started)
+        self.apply_retention()
+        dump_logger.info(
+            f"Full dump finished: {path}, {os.path.getsize(path)} bytes"
+        )
+        return path
+
+    def dump_incremental(self) -> Optional[str]:
+        watermark = self.load_watermark()
+        since = watermark - WATERMARK_OVERLAP if watermark else None
+        path = self.new_path(INCREMENTAL_PREFIX, ".jsonl.gz")
+
+        rows = 0
+        newest = watermark
+        with self.open_dump(path) as file:
+            for cars in self.db.iter_cars(CHUNK_SIZE, since):
+                for car in cars:
+                    file.write(
+                        json.dumps(asdict(car), default=str).encode() + b"\n"
+                    )
+                    if newest is None or car.datetime_found > newest:
+                        newest = car.datetime_found
+                rows += len(cars)
+
+        if newest == watermark:
+            # Only the overlap window was read, nothing new since last time
+            os.remove(path)
+            return None
+
+        self.save_watermark(newest)
+        dump_logger.info(f"Incremental dump of {rows} cars: {path}")
+        return path
+
+    def load_watermark(self) -> Optional[datetime]:
+        if not os.path.exists(self.watermark_path):
+            return None
+        with open(self.watermark_path) as file:
+            return datetime.fromisoformat(json.load(file)["datetime_found"])
+
+    def save_watermark(self, watermark: datetime) -> None:
+        partial = self.watermark_path + ".partial"
+        with open(partial, "w") as file:
+            json.dump({"datetime_found": watermark.isoformat()}, file)
+        os.replace(partial, self.watermark_path)
+
+    def apply_retention(self) -> None:
+        """
+        Keeps the newest `keep` full dumps and the incremental dumps
+        taken after the oldest of them.
+        """
+        full_dumps = self.list_dumps(FULL_PREFIX)
+        if len(full_dumps) <= self.keep:
+            return
+
+        expired = full_dumps[:-self.keep]
+        oldest_kept = full_dumps[-self.keep][len(FULL_PREFIX):]
+        expired.extend(
+            name for name in self.list_dumps(INCREMENTAL_PREFIX)
+            if name[len(INCREMENTAL_PREFIX):] < oldest_kept
+        )
+        for name in expired:
+            os.remove(os.path.join(self.directory, name))
+            dump_logger.info(f"Removed old dump {name}")
+
+    def next_full_dump(self) -> datetime:
+        now = datetime.now()
+        scheduled = now.replace(
+            hour=envs.DUMP_HOUR, minute=envs.DUMP_MINUTE,
+            second=0, microsecond=0
+        )
+        if scheduled <= now:
+            scheduled += timedelta(days=1)
+        return scheduled
+
+    def run(self) -> None:
+        if not self.list_dumps(FULL_PREFIX):
+            self.dump_full()
+
+        while not self.stop_event.is_set():
+            next_full = self.next_full_dump()
+            wait = min(
+                self.interval, (next_full - datetime.now()).total_seconds()
+            )
+            if self.stop_event.wait(max(wait, 0)):
+                return
+
+            try:
+                if datetime.now() >= next_full:
+                    self.dump_full()
+                else:
+                    self.dump_incremental()
+            except Exception as e:
+                dump_logger.error(f"Dump failed: {e}")
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.run, name="dumps", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,142 @@
+import os
+from dataclasses import asdict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from database.db_layer import DBInterface, DBType
+from utils import dto
+from utils.log import get_logger
+
+
+export_logger = get_logger("Export")
+
+ExportFormat = Literal["parquet", "arrow"]
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def car_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("url", pa.string()),
+            ("title", pa.string()),
+            ("price_usd", pa.float64()),
+            ("odometer", pa.float64()),
+            ("username", pa.string()),
+            ("phone_number", pa.string()),
+            ("image_url", pa.string()),
+            ("images_count", pa.int64()),
+            ("car_number", pa.string()),
+            ("car_vin", pa.string()),
+            ("datetime_found", pa.timestamp("us")),
+        ]
+    )
+
+
+class CarExporter:
+    """
+    Writes cars ordered by datetime_found into one file per date, laid
+    out as <directory>/date=YYYY-MM-DD/<name>.<format> so the output can
+    be read back as a hive-partitioned dataset. Only the file of the
+    current date is open, its rows are buffered into row groups of
+    `row_group_size`, so memory and file handles do not grow with the
+    number of dates.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        format: ExportFormat = "parquet",
+        name: str = "cars",
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        if pa is None:
+            raise ImportError("Export needs pyarrow: pip install pyarrow")
+
+        self.directory = directory
+        self.format = format
+        self.name = name
+        self.row_group_size = row_group_size
+        self.schema = car_schema()
+        self.day: Optional[date] = None
+        self.writer: Any = None
+        self.buffer: List[Dict[str, Any]] = []
+        self.written_days: Set[date] = set()
+        self.rows = 0
+
+    def path(self, day: date) -> str:
+        partition = os.path.join(self.directory, f"date={day.isoformat()}")
+        os.makedirs(partition, exist_ok=True)
+        return os.path.join(
+            partition, f"{self.name}.{EXTENSIONS[self.format]}"
+        )
+
+    def open(self, day: date) -> None:
+        if day in self.written_days:
+            # Reopening would overwrite the finished file
+            raise ValueError(
+                f"Cars of {day} came after a later date, "
+                f"export expects them ordered by datetime_found"
+            )
+        self.close()
+
+        path = self.path(day)
+        if self.format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+        self.day = day
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        table = pa.Table.from_pylist(self.buffer, schema=self.schema)
+        self.writer.write_table(table)
+        self.rows += len(self.buffer)
+        self.buffer = []
+
+    def write(self, cars: List[dto.Car]) -> None:
+        for car in cars:
+            day = car.datetime_found.date()
+            if day != self.day:
+                self.open(day)
+            self.buffer.append(asdict(car))
+            if len(self.buffer) >= self.row_group_size:
+                self.flush()
+
+    def close(self) -> None:
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.written_days.add(self.day)
+        self.writer = None
+        self.day = None
+
+    def export(self, chunks: Iterable[List[dto.Car]]) -> int:
+        try:
+            for cars in chunks:
+                self.write(cars)
+        finally:
+            self.close()
+        return self.rows
+
+
+def export_cars(
+    db_type: DBType,
+    directory: str,
+    format: ExportFormat = "parquet",
+    chunk_size: int = 10000,
+) -> int:
+    exporter = CarExporter(directory, format)
+    rows = exporter.export(
+        DBInterface(db_type).iter_cars(chunk_size, order_by="datetime_found")
+    )
+    export_logger.info(f"Exported {rows} cars to {directory}")
+    return rows
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from sqlalchemy import (
     Column,
     Integer,
@@ -5,7 +7,8 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     DateTime,
-    Boolean
+    Boolean,
+    UniqueConstraint
 )
 
 from database.config import Base
@@ -30,16 +33,20 @@ class Car(Base):
 
 class Task(Base):
     __tablename__ = "task"
+    __table_args__ = (UniqueConstraint("cycle", "page_number"),)
 
     id = Column(Integer, primary_key=True, index=True)
+    cycle = Column(Integer, nullable=False, default=1)
     page_number = Column(Integer, nullable=False)
     in_work = Column(Boolean, default=False)
     completed = Column(Boolean, default=False)
+    empty = Column(Boolean, default=False)
+    created_at = Column(DateTime(), nullable=False, default=datetime.now)
 
 
 class Result(Base):
     __tablename__ = "result"
 
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("task.id"))
+    task_id = Column(Integer, ForeignKey("task.id", ondelete="SET NULL"))
     car_id = Column(Integer, ForeignKey("car.id"))
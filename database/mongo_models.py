@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from mongoengine import (
     Document,
     StringField,
@@ -24,9 +26,12 @@ class Car(Document):
 
 
 class Task(Document):
-    page_number = IntField(required=True)
+    cycle = IntField(required=True, default=1)
+    page_number = IntField(required=True, unique_with="cycle")
     in_work = BooleanField(default=False)
     completed = BooleanField(default=False)
+    empty = BooleanField(default=False)
+    created_at = DateTimeField(required=True, default=datetime.now)
 
 
 class Result(Document):
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from database.dal import TaskDAL
+from utils.dto import CycleState
+from utils.log import get_logger
+import envs
+
+
+scheduler_logger = get_logger("Scheduler")
+
+
+class TaskScheduler:
+    """
+    Generates page tasks from the crawl frontier. Every cycle starts at
+    page 1 and keeps `window` unfinished pages ahead of the workers until
+    a page comes back empty or `max_pages` is reached. The next cycle
+    starts `interval` seconds after the previous one began, only the last
+    `keep_cycles` cycles stay in the task table.
+    """
+
+    def __init__(
+        self,
+        task_dal: TaskDAL,
+        window: int = envs.CRAWL_WINDOW,
+        max_pages: int = envs.PAGES,
+        interval: int = envs.CRAWL_INTERVAL,
+        keep_cycles: int = envs.CRAWL_KEEP_CYCLES,
+    ) -> None:
+        self.task_dal = task_dal
+        self.window = window
+        self.max_pages = max_pages
+        self.interval = timedelta(seconds=interval)
+        self.keep_cycles = keep_cycles
+
+    def is_finished(self, state: CycleState) -> bool:
+        return not state.open_tasks and (
+            state.boundary is not None or state.frontier >= self.max_pages
+        )
+
+    def schedule(self) -> int:
+        """Tops the current cycle up or starts the next one when due."""
+        state = self.task_dal.get_cycle_state()
+        if state is None:
+            return self.start_cycle(1)
+
+        if self.is_finished(state):
+            if datetime.now() >= state.started + self.interval:
+                return self.start_cycle(state.cycle + 1)
+            return 0
+
+        if state.boundary is not None:
+            return 0
+
+        last_page = min(
+            state.frontier + self.window - state.open_tasks, self.max_pages
+        )
+        if last_page <= state.frontier:
+            return 0
+        return self.task_dal.create_tasks(
+            state.cycle, range(state.frontier + 1, last_page + 1)
+        )
+
+    def start_cycle(self, cycle: int) -> int:
+        scheduler_logger.info(f"Starting crawl cycle {cycle}")
+        self.task_dal.delete_cycles_before(cycle - self.keep_cycles + 1)
+        return self.task_dal.create_tasks(
+            cycle, range(1, min(self.window, self.max_pages) + 1)
+        )
+
+    def report_empty(self, task_id: int) -> None:
+        page_number = self.task_dal.mark_empty(task_id)
+        if page_number is not None:
+            scheduler_logger.info(
+                f"Page {page_number} is empty, closing the cycle after it"
+            )
@@ -0,0 +1,134 @@
+from datetime import datetime
+from typing import Any, List
+
+from mongoengine.connection import get_db
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from database import mongo_models
+from utils.log import get_logger
+
+
+schema_logger = get_logger("Schema")
+
+# Columns the task table gained with crawl cycles. created_at is added
+# nullable and backfilled, SQLite cannot add a column with a
+# non-constant default
+TASK_COLUMNS = {
+    "cycle": "cycle INTEGER NOT NULL DEFAULT 1",
+    "empty": "empty BOOLEAN DEFAULT FALSE",
+    "created_at": "created_at TIMESTAMP",
+}
+TASK_UNIQUE = ["cycle", "page_number"]
+
+# Earlier versions inserted pages 1..N on every start, the oldest row
+# of every (cycle, page_number) is kept
+DUPLICATE_TASKS = (
+    "SELECT id FROM task WHERE id NOT IN "
+    "(SELECT MIN(id) FROM task GROUP BY cycle, page_number)"
+)
+
+
+def has_task_unique(engine: Engine) -> bool:
+    inspector = inspect(engine)
+    constraints = [
+        *inspector.get_unique_constraints("task"),
+        *(
+            index for index in inspector.get_indexes("task")
+            if index["unique"]
+        ),
+    ]
+    return any(
+        constraint["column_names"] == TASK_UNIQUE
+        for constraint in constraints
+    )
+
+
+def upgrade_sql(engine: Engine) -> None:
+    """
+    Brings a task table created before crawl cycles up to date, safe to
+    run on every start. create_all only creates missing tables.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("task"):
+        return
+
+    columns = {column["name"] for column in inspector.get_columns("task")}
+    missing = [name for name in TASK_COLUMNS if name not in columns]
+    unique = has_task_unique(engine)
+    if not missing and unique:
+        return
+
+    schema_logger.info("Upgrading the task table to crawl cycles")
+    with engine.begin() as connection:
+        for name in missing:
+            connection.execute(
+                text(f"ALTER TABLE task ADD COLUMN {TASK_COLUMNS[name]}")
+            )
+        connection.execute(
+            text("UPDATE task SET created_at = :now WHERE created_at IS NULL"),
+            {"now": datetime.now()},
+        )
+        if "created_at" in missing and engine.dialect.name == "postgresql":
+            connection.execute(
+                text("ALTER TABLE task ALTER COLUMN created_at SET NOT NULL")
+            )
+
+        if not unique:
+            if inspector.has_table("result"):
+                connection.execute(
+                    text(
+                        "UPDATE result SET task_id = NULL "
+                        f"WHERE task_id IN ({DUPLICATE_TASKS})"
+                    )
+                )
+            deleted = connection.execute(
+                text(f"DELETE FROM task WHERE id IN ({DUPLICATE_TASKS})")
+            ).rowcount
+            connection.execute(
+                text(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS "
+                    "task_cycle_page_number ON task (cycle, page_number)"
+                )
+            )
+            schema_logger.info(f"Removed {deleted} duplicate tasks")
+
+
+def upgrade_mongo() -> None:
+    """
+    Backfills the crawl cycle fields and drops duplicate tasks, so the
+    (cycle, page_number) unique index can be built.
+    """
+    db = get_db()
+    tasks = db[mongo_models.Task._get_collection_name()]
+    results = db[mongo_models.Result._get_collection_name()]
+
+    tasks.update_many({"cycle": None}, {"$set": {"cycle": 1}})
+    tasks.update_many({"empty": None}, {"$set": {"empty": False}})
+    tasks.update_many(
+        {"created_at": None}, {"$set": {"created_at": datetime.now()}}
+    )
+
+    duplicates: List[Any] = []
+    for group in tasks.aggregate(
+        [
+            {"$sort": {"_id": 1}},
+            {
+                "$group": {
+                    "_id": {"cycle": "$cycle", "page_number": "$page_number"},
+                    "ids": {"$push": "$_id"},
+                }
+            },
+            {"$match": {"ids.1": {"$exists": True}}},
+        ]
+    ):
+        duplicates.extend(group["ids"][1:])
+
+    if duplicates:
+        results.update_many(
+            {"task": {"$in": duplicates}}, {"$unset": {"task": ""}}
+        )
+        tasks.delete_many({"_id": {"$in": duplicates}})
+        schema_logger.info(f"Removed {len(duplicates)} duplicate tasks")
+
+    mongo_models.Task.ensure_indexes()
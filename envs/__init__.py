@@ -19,10 +19,52 @@ try:
     REDIS_HOST = env.str("REDIS_HOST")
     REDIS_PORT = env.int("REDIS_PORT")
     REDIS_PASSWORD = env.str("REDIS_PASSWORD")
+    REDIS_DB = env.int("REDIS_DB", 0)
     MONGO_URI = env.str("MONGO_URI")
+    SQLITE_PATH = env.str("SQLITE_PATH", "autoria.sqlite3")
+    DB_TYPE = env.str("DB_TYPE", "postgresql")
 
     PAGES = env.int("PAGES")
 
+    BASE_URL = env.str("BASE_URL", "https://auto.ria.com/uk/car/used/")
+    PHONE_URL = env.str("PHONE_URL", "https://auto.ria.com/users/phones/")
+
+    MAX_PAGE_SIZE = env.int("MAX_PAGE_SIZE", 4 * 1024 * 1024)
+    SHM_BUDGET = env.int("SHM_BUDGET", 48 * 1024 * 1024)
+
+    HTTP_CACHE_MODE = env.str("HTTP_CACHE_MODE", "off")
+    HTTP_CACHE_PATH = env.str("HTTP_CACHE_PATH", "cache/http.sqlite3")
+    HTTP_CACHE_TTL = env.int("HTTP_CACHE_TTL", 60 * 60)
+    HTTP_CACHE_MAX_SIZE = env.int("HTTP_CACHE_MAX_SIZE", 1024 ** 3)
+
+    DUMP_DIR = env.str("DUMP_DIR", "dumps")
+    DUMP_HOUR = env.int("DUMP_HOUR", 12)
+    DUMP_MINUTE = env.int("DUMP_MINUTE", 0)
+    DUMP_INTERVAL = env.int("DUMP_INTERVAL", 60 * 60)
+    DUMP_KEEP = env.int("DUMP_KEEP", 7)
+
+    RATE_LIMIT_ENABLED = env.bool("RATE_LIMIT_ENABLED", False)
+    RATE_LIMIT_LIST = env.float("RATE_LIMIT_LIST", 1.0)
+    RATE_LIMIT_DETAIL = env.float("RATE_LIMIT_DETAIL", 5.0)
+    RATE_LIMIT_PHONE = env.float("RATE_LIMIT_PHONE", 2.0)
+    RATE_LIMIT_BURST = env.float("RATE_LIMIT_BURST", 2.0)
+
+    WORKER_ID = env.str("WORKER_ID", "")
+    LEASE_TTL = env.float("LEASE_TTL", 60.0)
+    TASK_MAX_ATTEMPTS = env.int("TASK_MAX_ATTEMPTS", 3)
+    WORKER_PAGES = env.int("WORKER_PAGES", 4)
+    WORKER_PREFETCH = env.int("WORKER_PREFETCH", 2)
+    WORKER_HTTP_FIRST = env.bool("WORKER_HTTP_FIRST", True)
+
+    CRAWL_WINDOW = env.int("CRAWL_WINDOW", 10)
+    CRAWL_INTERVAL = env.int("CRAWL_INTERVAL", 24 * 60 * 60)
+    CRAWL_KEEP_CYCLES = env.int("CRAWL_KEEP_CYCLES", 3)
+
+    BLOOM_ENABLED = env.bool("BLOOM_ENABLED", False)
+    BLOOM_CAPACITY = env.int("BLOOM_CAPACITY", 10_000_000)
+    BLOOM_ERROR_RATE = env.float("BLOOM_ERROR_RATE", 0.001)
+    BLOOM_REFRESH = env.float("BLOOM_REFRESH", 60.0)
+
 except Exception as e:
     print(e)
     exit()
@@ -1,45 +1,47 @@
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List, Optional
 import asyncio
 import aiohttp
-from parsel import Selector
 
+from autoria.pipeline import Pipeline
 from database.dal import CarDAL
-from parsers.parser import AutoriaParser, AutoriaParserV1
+from database.db_layer import DBType
 from utils.dto import Car
-from utils.exceptions import (
-    EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from utils.exceptions import EmptyPageException
 from utils.log import get_logger
 import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 scraper_logger = get_logger("AutoriaScraper")
 
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal["postgresql", "mongodb"]) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_tasks: int = 100,
+    ) -> None:
         self.results: List[Car] = []
 
         self.tasks: List[asyncio.Task] = []
-        self.max_tasks = 100
+        self.max_tasks = max_tasks
+        # Created in run(), they belong to its event loop
+        self.detail_slots: Optional[asyncio.Semaphore] = None
+        self.session: Optional[aiohttp.ClientSession] = None
 
-        self.db: CarDAL = CarDAL(db_type)
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
         self.db_is_busy = False
         self.global_stop = False
 
-        self.pages = envs.PAGES
+        self.pages = pages
 
     def start_db(self) -> None:
         self.db_task = asyncio.create_task(self.bulk_save())
 
     async def bulk_save(self) -> None:
-        while not self.global_stop or self.db_is_busy:
+        while not self.global_stop or self.results:
 
             await asyncio.sleep(0.01)
 
@@ -53,7 +55,7 @@ class AutoriaScraper:
             for item in self.results[:]:
                 self.results.remove(item)
                 results.append(item)
-            await asyncio.to_thread(self.db.process_items, results)
+            await asyncio.to_thread(self.pipeline.sink, results)
 
     def clean_tasks(self) -> None:
         for task in self.tasks:
@@ -68,38 +70,46 @@ class AutoriaScraper:
         self,
         page_number: int,
     ) -> None:
-        page = await self.get_page(
-            urljoin(BASE_URL, f"?page={page_number}")
-        )
-
         scraper_logger.info(f"Parsing page {page_number}")
 
-        urls = AutoriaParser.get_urls(page)
+        detail_tasks: List[asyncio.Task] = []
 
-        for url in urls:
-            detailed_page = await self.get_page(url)
-            page = Selector(text=detailed_page)
+        async for url in self.pipeline.async_iter_urls(
+            page_number, self.session
+        ):
+            # Detail pages of all list pages share max_tasks slots, the
+            # list stream waits here while they are taken
+            await self.detail_slots.acquire()
+            detail_tasks.append(
+                asyncio.create_task(self.run_detail(url))
+            )
 
-            if not page.xpath("//*[contains(@class, 'phone_show_link')]"):
-                scraper_logger.info("Skipped page with new design.")
-                continue
-            else:
-                parser = AutoriaParserV1(detailed_page, url)
-
-            try:
-                self.results.append(
-                    parser.parse_detail_page()
-                )
-            except (SoldException, NoVinException, NoUsernameException):
-                continue
+        await asyncio.gather(*detail_tasks)
 
         scraper_logger.info(f"Finished parsing page {page_number}")
 
+    async def run_detail(self, url: str) -> None:
+        try:
+            await self.get_detail_car_data(url)
+        finally:
+            self.detail_slots.release()
+
+    async def get_detail_car_data(self, url: str) -> None:
+        detailed_page = await self.pipeline.async_fetch(url, self.session)
+        if detailed_page is None:
+            return
+
+        car = await self.pipeline.async_parse_unique(detailed_page, url)
+        if car is not None:
+            self.results.append(car)
+
     async def run(self) -> None:
         current_page: int = 1
 
         scraper_logger.info("Launched parser")
 
+        self.detail_slots = asyncio.Semaphore(self.max_tasks)
+        self.session = aiohttp.ClientSession()
         self.start_db()
 
         try:
@@ -118,29 +128,18 @@ class AutoriaScraper:
                 await asyncio.sleep(0.01)
         finally:
             await asyncio.gather(*self.tasks)
+            await self.session.close()
 
             self.global_stop = True
 
-            while self.db_is_busy:
-                await asyncio.sleep(0.1)
+            await self.db_task
 
             scraper_logger.info("Finished parsing")
-
-    @classmethod
-    async def get_page(self, url: str) -> str:
-        while True:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    html = await response.text()
-
-                    if AutoriaParser.validate(html):
-                        return html
-
-            await asyncio.sleep(1)
+            self.pipeline.log_stats()
 
 
 async def main() -> None:
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     await scraper.run()
 
 
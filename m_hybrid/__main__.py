@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import aiohttp
+
+from autoria.pipeline import Pipeline
+from database.db_layer import DBType
+from m_asyncio.__main__ import AutoriaScraper as AsyncioScraper
+from utils.dto import Car
+from utils.exceptions import CacheMissException, PageTooLargeException
+from utils.fetch import async_fetch_body
+from utils.log import get_logger
+from utils.shm import PageDescriptor, SharedRingBuffer
+import envs
+
+
+scraper_logger = get_logger("AutoriaScraper")
+
+
+class AutoriaScraper(AsyncioScraper):
+    """
+    Fetches on the event loop like m_asyncio, but parses every detail page
+    in a process pool so CPU-bound XPath work never blocks the fetches.
+    With shared_memory pages are written into a SharedRingBuffer and only
+    a PageDescriptor is pickled to the parser process.
+    """
+
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_tasks: int = 100,
+        workers: Optional[int] = None,
+        shared_memory: bool = False,
+    ) -> None:
+        super().__init__(db_type, pages=pages, max_tasks=max_tasks)
+        self.workers = workers
+        self.shared_memory = shared_memory
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.ring: Optional[SharedRingBuffer] = None
+
+    async def fetch_body(
+        self,
+        url: str
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        try:
+            return await async_fetch_body(self.session, url)
+        except (
+            aiohttp.ClientError,
+            CacheMissException,
+            PageTooLargeException,
+        ) as e:
+            scraper_logger.warning(f"{e}: {url}")
+            return None
+
+    async def parse_body(
+        self,
+        url: str,
+        body: bytes,
+        encoding: Optional[str]
+    ) -> Optional[Car]:
+        """
+        Copies the page into a free slot once it has arrived, so a slot
+        is only held while the page is parsed. Without a free slot the
+        page is pickled as a string instead.
+        """
+        slot = self.ring.acquire()
+        if slot is None:
+            html = str(body, encoding or "utf-8", "replace")
+            return await self.parse_page(html, url)
+
+        try:
+            self.ring.write(slot, 0, body)
+            descriptor = PageDescriptor(
+                buffer=self.ring.name,
+                slot=slot,
+                offset=self.ring.offset(slot),
+                length=len(body),
+                url=url,
+                encoding=encoding,
+            )
+            return await self.pipeline.async_parse_unique_in(
+                self.executor,
+                Pipeline.parse_vin_shared,
+                Pipeline.parse_shared,
+                descriptor,
+            )
+        finally:
+            self.ring.release(slot)
+
+    async def parse_page(self, html: str, url: str) -> Optional[Car]:
+        return await self.pipeline.async_parse_unique_in(
+            self.executor, Pipeline.parse_vin, Pipeline.parse, html, url
+        )
+
+    async def get_detail_car_data(self, url: str) -> None:
+        if self.ring is not None:
+            fetched = await self.fetch_body(url)
+            if fetched is None:
+                return
+            car = await self.parse_body(url, *fetched)
+        else:
+            detailed_page = await self.pipeline.async_fetch(
+                url, self.session
+            )
+            if detailed_page is None:
+                return
+            car = await self.parse_page(detailed_page, url)
+
+        if car is not None:
+            self.results.append(car)
+
+    @property
+    def ring_slots(self) -> int:
+        """
+        A slot is held from the arrival of a page until it is parsed, so
+        up to max_tasks pages can wait in the pool. SHM_BUDGET caps the
+        ring, pages beyond it are passed as strings.
+        """
+        budget = envs.SHM_BUDGET // envs.MAX_PAGE_SIZE
+        return max(1, min(self.max_tasks, budget))
+
+    async def run(self) -> None:
+        if self.shared_memory:
+            self.ring = SharedRingBuffer(self.ring_slots, envs.MAX_PAGE_SIZE)
+        self.executor = ProcessPoolExecutor(self.workers)
+        try:
+            await super().run()
+        finally:
+            self.executor.shutdown()
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+
+async def main() -> None:
+    scraper = AutoriaScraper(envs.DB_TYPE)
+    await scraper.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,13 @@
 from typing import List, Literal
-import json
-from dataclasses import asdict
 import time
 from datetime import datetime
 
 from database.dal import TaskDAL, ResultDAL
-from database.db_layer import DBInterface
+from database.dumps import DumpManager
+from database.scheduler import TaskScheduler
 from utils.dto import Car, Task, Result
-from utils.cache import Cache
+from utils.task_queue import TaskQueue
 from utils.log import get_logger
-from utils.encoders import ObjectIdEncoder
 
 
 orchestrator_logger = get_logger("Orchestrator")
@@ -19,16 +17,18 @@ class Orchestrator:
     def __init__(self, db_type: Literal["postgresql", "mongodb"]) -> None:
         self.tasks: List[Task] = []
         self.results: List[Result] = []
-        self.cache_0: Cache = Cache(0)
+        self.queue: TaskQueue = TaskQueue()
 
         self.task_dal: TaskDAL = TaskDAL(db_type)
         self.result_dal: ResultDAL = ResultDAL(db_type)
+        self.scheduler: TaskScheduler = TaskScheduler(self.task_dal)
 
-    def create_tasks(self) -> None:
-        self.task_dal.create_tasks()
+    def schedule_tasks(self) -> None:
+        self.scheduler.schedule()
 
     def reset_tasks_status(self) -> None:
-        self.task_dal.reset_tasks_status()
+        # Tasks still in Redis survived the restart, only the rest are lost
+        self.task_dal.reset_tasks_status(self.queue.in_flight())
 
     def get_tasks(self, count: int = 10) -> None:
         self.tasks.extend(
@@ -36,20 +36,12 @@ class Orchestrator:
         )
 
     def pass_tasks(self) -> None:
-        for task in self.tasks:
-            self.cache_0.red.lpush(
-                "tasks_queue",
-                json.dumps(asdict(task), cls=ObjectIdEncoder)
-            )
+        self.queue.push(self.tasks)
         self.tasks = []
 
     def get_results(self) -> None:
         orchestrator_logger.info("Getting results from Redis")
-        while True:
-            item = self.cache_0.red.rpop("results_queue")
-            if not item:
-                return
-            data = json.loads(item)
+        for data in self.queue.pop_results():
             result = Result(
                 task_id=data.pop("task_id"),
                 car=Car(
@@ -66,19 +58,45 @@ class Orchestrator:
             self.result_dal.save_results(self.results)
             self.results = []
 
+    def complete_tasks(self) -> None:
+        # Pages without new cars leave no results but are finished too
+        done_tasks = self.queue.pop_done()
+        self.task_dal.complete_tasks(
+            [done["task_id"] for done in done_tasks]
+        )
+        for done in done_tasks:
+            if done.get("empty"):
+                self.scheduler.report_empty(done["task_id"])
+
+    def reap_tasks(self) -> None:
+        self.queue.reap()
+
+    def fail_tasks(self) -> None:
+        # Dead tasks are closed so the cycle can finish without them
+        failed_tasks = self.queue.pop_failed()
+        for task in failed_tasks:
+            orchestrator_logger.error(
+                f"Giving up on page {task['page_number']} of cycle "
+                f"{task['cycle']} after {task['attempts']} attempts"
+            )
+        self.task_dal.complete_tasks([task["id"] for task in failed_tasks])
+
     def run(self) -> None:
-        self.create_tasks()
         self.reset_tasks_status()
 
         while True:
+            self.reap_tasks()
+            self.schedule_tasks()
             self.get_tasks()
             self.pass_tasks()
             self.get_results()
             self.save_results()
+            self.complete_tasks()
+            self.fail_tasks()
             time.sleep(5)
 
 
 if __name__ == "__main__":
-    DBInterface("postgresql").create_database_dump()
+    DumpManager("postgresql").start()
     orchestrator = Orchestrator("mongodb")
     orchestrator.run()
@@ -1,6 +1,5 @@
 import asyncio
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List
 from playwright.async_api import (
     async_playwright,
     Playwright,
@@ -9,36 +8,42 @@ from playwright.async_api import (
     Page
 )
 
-from parsers.parser import AutoriaParser, AutoriaParserV1, AutoriaParserV2
-from utils.exceptions import (
-    EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from autoria.pipeline import Pipeline
+from parsers.parser import AutoriaParser
+from utils.exceptions import EmptyPageException
+from utils.interception import AsyncResponseCapture
+from utils.rate_limit import async_throttle
 from utils.log import get_logger
 from utils.dto import Car
 import envs
 from database.dal import CarDAL
+from database.db_layer import DBType
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 scraper_logger = get_logger("AutoriaScraper")
 
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal['postgresql', 'mongodb']) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_tasks: int = 2,
+        headless: bool = False,
+    ) -> None:
         self.results: List[Car] = []
-        self.pages: int = envs.PAGES
+        self.pages: int = pages
 
         self.tasks: List[asyncio.Task] = []
         self.db_task: asyncio.Task = None
-        self.max_tasks: int = 2
+        self.max_tasks: int = max_tasks
 
         self.db_is_busy: bool = False
         self.global_stop: bool = False
-        self.db: CarDAL = CarDAL(db_type)
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
+        self.headless: bool = headless
 
         self.playwright: Playwright = None
         self.browser: Browser = None
@@ -48,7 +53,7 @@ class AutoriaScraper:
         self.db_task = asyncio.create_task(self.bulk_save())
 
     async def bulk_save(self) -> None:
-        while not self.global_stop:
+        while not self.global_stop or self.results:
 
             await asyncio.sleep(0.01)
 
@@ -62,14 +67,14 @@ class AutoriaScraper:
             for item in self.results[:]:
                 self.results.remove(item)
                 results.append(item)
-            await asyncio.to_thread(self.db.process_items, results)
+            await asyncio.to_thread(self.pipeline.sink, results)
 
         scraper_logger.info("Database was shut down")
 
     async def start_playwright(self) -> None:
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch(
-            headless=False,
+            headless=self.headless,
         )
         self.context = await self.browser.new_context()
         scraper_logger.info("Started Playwright")
@@ -97,7 +102,8 @@ class AutoriaScraper:
             await page.close()
 
     async def scrape_list_page(self, page: Page, page_number: int) -> None:
-        await page.goto(urljoin(BASE_URL, f"?page={page_number}"))
+        await async_throttle("list")
+        await page.goto(self.pipeline.list_page_url(page_number))
 
         content = await page.content()
 
@@ -109,27 +115,30 @@ class AutoriaScraper:
 
         scraper_logger.info(f"Parsing page {page_number}")
 
-        for url in urls:
-            await page.goto(url)
-
-            if await page.query_selector(
-                "//*[contains(@class, 'phone_show_link')]"
-            ):
-                content = await page.content()
-                parser = AutoriaParserV1(content, url)
-            else:
-                print("Skipped page with new design:", url)
-                print(
-                    await page.query_selector(
-                        "//div[@id='sellerInfoHiddenPhone']"
-                    )
-                )
-                continue
+        capture = AsyncResponseCapture(page)
+        try:
+            for url in urls:
+                await async_throttle("detail")
+                capture.clear()
+                await page.goto(url)
 
-            try:
-                self.results.append(parser.parse_detail_page())
-            except (NoVinException, NoUsernameException, SoldException):
-                continue
+                car = await self.pipeline.async_parse_unique_lazy(
+                    await page.content(), url
+                )
+                if car is None:
+                    continue
+                # Only new cars pay for the phone click
+                await capture.reveal_phone()
+                car.add_responses(await capture.collect())
+                # Falls back to a blocking phone request when the click
+                # response was not captured
+                car = self.pipeline.record(
+                    await asyncio.to_thread(car.try_car)
+                )
+                if car is not None:
+                    self.results.append(car)
+        finally:
+            capture.detach()
 
         scraper_logger.info(f"Finished parsing page {page_number}")
 
@@ -160,16 +169,16 @@ class AutoriaScraper:
 
             self.global_stop = True
 
-            while self.db_is_busy:
-                await asyncio.sleep(0.01)
+            await self.db_task
 
             await self.stop_playwright()
 
             scraper_logger.info("Finished parsing")
+            self.pipeline.log_stats()
 
 
 async def main() -> None:
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     await scraper.run()
 
 
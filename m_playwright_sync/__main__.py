@@ -1,36 +1,41 @@
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List
 from playwright.sync_api import sync_playwright
 
+from autoria.pipeline import Pipeline
 from database.dal import CarDAL
-from parsers.parser import AutoriaParser, AutoriaParserV1, AutoriaParserV2
+from database.db_layer import DBType
+from parsers.parser import AutoriaParser
 from utils.dto import Car
-from utils.exceptions import (
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from utils.interception import ResponseCapture
+from utils.rate_limit import throttle
 from utils.log import get_logger
 import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 scraper_logger = get_logger("AutoriaScraper")
 
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal['postgresql', 'mongodb']) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        headless: bool = False,
+    ) -> None:
         self.results: List[Car] = []
-        self.pages = envs.PAGES
-        self.db: CarDAL = CarDAL(db_type)
+        self.pages = pages
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
+        self.headless = headless
 
     def bulk_save(self) -> None:
-        self.db.process_items(self.results)
+        self.pipeline.sink(self.results)
         self.results = []
 
     def scrape_list_page(self, page, page_number: int) -> None:
-        page.goto(urljoin(BASE_URL, f"?page={page_number}"))
+        throttle("list")
+        page.goto(self.pipeline.list_page_url(page_number))
         content = page.content()
 
         if not AutoriaParser.check_list_page(content):
@@ -39,28 +44,24 @@ class AutoriaScraper:
 
         urls = AutoriaParser.get_urls(content)
         scraper_logger.info(f"Parsing page {page_number}")
-        for url in urls:
-            page.goto(url)
-            content = page.content()
-
-            if page.query_selector(
-                "//*[contains(@class, 'phone_show_link')]"
-            ):
-                content = page.content()
-                parser = AutoriaParserV1(content, url)
-            else:
-                print("Skipped page with new design:", url)
-                print(
-                    page.query_selector(
-                        "//div[@id='sellerInfoHiddenPhone']"
-                    )
-                )
-                continue
-
-            try:
-                self.results.append(parser.parse_detail_page())
-            except (NoVinException, NoUsernameException, SoldException):
-                continue
+        capture = ResponseCapture(page)
+        try:
+            for url in urls:
+                throttle("detail")
+                capture.clear()
+                page.goto(url)
+
+                car = self.pipeline.parse_unique_lazy(page.content(), url)
+                if car is None:
+                    continue
+                # Only new cars pay for the phone click
+                capture.reveal_phone()
+                car.add_responses(capture.collect())
+                car = self.pipeline.record(car.try_car())
+                if car is not None:
+                    self.results.append(car)
+        finally:
+            capture.detach()
 
         self.bulk_save()
         scraper_logger.info(f"Finished parsing page {page_number}")
@@ -68,7 +69,7 @@ class AutoriaScraper:
     def run(self) -> None:
         with sync_playwright() as pw:
             browser = pw.chromium.launch(
-                headless=False,
+                headless=self.headless,
             )
             context = browser.new_context()
             page = context.new_page()
@@ -84,8 +85,9 @@ class AutoriaScraper:
                 current_page += 1
 
         scraper_logger.info("Finished parsing")
+        self.pipeline.log_stats()
 
 
 if __name__ == "__main__":
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     scraper.run()
@@ -1,5 +1,4 @@
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List
 import threading
 import time
 from playwright.sync_api import (
@@ -9,37 +8,42 @@ from playwright.sync_api import (
     BrowserContext,
     Page
 )
-from parsel import Selector
 
+from autoria.pipeline import Pipeline
 from database.dal import CarDAL
+from database.db_layer import DBType
 from utils.dto import Car
-from parsers.parser import AutoriaParser, AutoriaParserV1, AutoriaParserV2
-from utils.exceptions import (
-    EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from parsers.parser import AutoriaParser
+from utils.exceptions import EmptyPageException
+from utils.interception import ResponseCapture
+from utils.rate_limit import throttle
 from utils.log import get_logger
 import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 scraper_logger = get_logger("AutoriaScraper")
 
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal['postgresql', 'mongodb']) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_threads: int = 4,
+        headless: bool = False,
+    ) -> None:
         self.results: List[Car] = []
-        self.pages: int = envs.PAGES
+        self.pages: int = pages
 
         self.threads: List[threading.Thread] = []
-        self.max_threads: int = 4
+        self.max_threads: int = max_threads
 
         self.db_is_busy: bool = False
         self.db_thread: threading.Thread = None
-        self.db: CarDAL = CarDAL(db_type)
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
+        self.headless: bool = headless
 
     def start_db_thread(self) -> None:
         self.db_thread = threading.Thread(
@@ -62,7 +66,7 @@ class AutoriaScraper:
             for item in self.results[:]:
                 self.results.remove(item)
                 results.append(item)
-            self.db.process_items(results)
+            self.pipeline.sink(results)
 
     def clean_threads(self) -> None:
         for thread in self.threads:
@@ -72,7 +76,7 @@ class AutoriaScraper:
     def run_thread(self, page_number: int) -> None:
         playwright: Playwright = sync_playwright().start()
         browser: Browser = playwright.chromium.launch(
-            headless=False,
+            headless=self.headless,
         )
         context: BrowserContext = browser.new_context()
         page: Page = context.new_page()
@@ -85,7 +89,8 @@ class AutoriaScraper:
             playwright.stop()
 
     def scrape_list_page(self, page: Page, page_number: int) -> None:
-        page.goto(urljoin(BASE_URL, f"?page={page_number}"))
+        throttle("list")
+        page.goto(self.pipeline.list_page_url(page_number))
         content = page.content()
 
         if not AutoriaParser.check_list_page(content):
@@ -96,33 +101,24 @@ class AutoriaScraper:
 
         scraper_logger.info(f"Parsing page {page_number}")
 
-        for url in urls:
-            page.goto(url)
-
-            if page.query_selector(
-                "//*[contains(@class, 'phone_show_link')]"
-            ):
-                page.locator(
-                    "(//*[contains(@class, 'phone_show_link')])[1]"
-                ).click()
-
-                time.sleep(0.3)
-
-                content = page.content()
-                parser = AutoriaParserV1(content, url)
-            else:
-                content = page.content()
-                selector = Selector(text=content)
-                print(url)
-                print(selector.xpath(
-                    "//div[@class='sellerInfoHiddenPhone']"
-                    "//button[@class='s1 conversion']"
-                ))
-                continue
-            try:
-                self.results.append(parser.parse_detail_page())
-            except (NoVinException, NoUsernameException, SoldException):
-                continue
+        capture = ResponseCapture(page)
+        try:
+            for url in urls:
+                throttle("detail")
+                capture.clear()
+                page.goto(url)
+
+                car = self.pipeline.parse_unique_lazy(page.content(), url)
+                if car is None:
+                    continue
+                # Only new cars pay for the phone click
+                capture.reveal_phone()
+                car.add_responses(capture.collect())
+                car = self.pipeline.record(car.try_car())
+                if car is not None:
+                    self.results.append(car)
+        finally:
+            capture.detach()
 
         scraper_logger.info(f"Finished parsing page {page_number}")
 
@@ -155,12 +151,13 @@ class AutoriaScraper:
             for thread in self.threads:
                 thread.join()
 
-            while self.db_is_busy:
+            while self.results or self.db_is_busy:
                 time.sleep(0.1)
 
             scraper_logger.info("Finished parsing")
+            self.pipeline.log_stats()
 
 
 if __name__ == "__main__":
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     scraper.run()
@@ -1,6 +1,7 @@
 from m_processes.run_processes import AutoriaScraper
+import envs
 
 
 if __name__ == "__main__":
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     scraper.run()
@@ -1,94 +1,72 @@
-from parsel import Selector
-import requests
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List
 import threading
 import multiprocessing
 import time
-from requests.exceptions import ChunkedEncodingError
 
+from autoria.pipeline import Pipeline
 from database.dal import CarDAL
-from parsers.parser import AutoriaParser, AutoriaParserV1
-from utils.exceptions import (
-    EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from database.db_layer import DBType
+from utils.exceptions import EmptyPageException
 from utils.log import get_logger
 import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
-
 scraper_logger = get_logger("Scraper")
 
 
 class Scraper:
-    def __init__(self, queue: multiprocessing.Queue) -> None:
+    def __init__(self, queue: multiprocessing.Queue, db_type: DBType) -> None:
         self.queue = queue
+        self.db_type = db_type
 
     def get_list_page_data(
         self,
         page_number: int
     ) -> None:
-        page = self.get_page(
-            urljoin(BASE_URL, f"?page={page_number}")
-        )
-
         scraper_logger.info(f"Parsing page {page_number}")
 
-        urls = AutoriaParser.get_urls(page)
+        # Every page process checks VINs against the database itself, so
+        # the phone lookup is skipped for cars saved before. Cars shared
+        # with a page still in flight are dropped by the sink
+        pipeline = Pipeline(self.db_type)
         results = []
-        for url in urls:
-            detailed_page = self.get_page(url)
-            page = Selector(text=detailed_page)
-
-            if not page.xpath("//*[contains(@class, 'phone_show_link')]"):
-                scraper_logger.info("Skipped page with new design.")
-                continue
-            else:
-                parser = AutoriaParserV1(detailed_page, url)
-
-            try:
-                results.append(
-                    parser.parse_detail_page()
-                )
-            except (SoldException, NoVinException, NoUsernameException):
+        for url in Pipeline.iter_urls(page_number):
+            detailed_page = Pipeline.fetch(url)
+            if detailed_page is None:
                 continue
 
+            car = pipeline.parse_unique(detailed_page, url)
+            if car is not None:
+                results.append(car)
+
+        # The parent logs the stats of the whole run
         self.queue.put(
-            results
+            (results, pipeline.stats)
         )
 
         scraper_logger.info(
-            f"Finished parsing page {page_number}"
+            f"Finished parsing page {page_number}. "
+            f"{pipeline.stats.summary()}"
         )
 
-    @classmethod
-    def get_page(cls, url: str) -> str:
-        while True:
-            try:
-                response = requests.get(url, stream=False).text
-            except ChunkedEncodingError:
-                continue
-
-            if AutoriaParser.validate(response):
-                return response
-
-            time.sleep(1)
-
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal['postgresql', 'mongodb']) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_processes: int = 21,
+    ) -> None:
         self.processes: List[multiprocessing.Process] = []
         self.queue: multiprocessing.Queue = multiprocessing.Queue()
-        self.max_processes: int = 21
+        self.max_processes: int = max_processes
 
-        self.db: CarDAL = CarDAL(db_type)
+        self.db_type: DBType = db_type
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
 
-        self.pages: int = envs.PAGES
+        self.pages: int = pages
 
     def run_db_thread(self) -> None:
         self.db_thread: threading.Thread = threading.Thread(
@@ -99,8 +77,12 @@ class AutoriaScraper:
 
     def bulk_save(self) -> None:
         while True:
-            results = self.queue.get()
-            self.db.process_items(results)
+            item = self.queue.get()
+            if item is None:
+                return
+            results, stats = item
+            self.pipeline.merge_stats(stats)
+            self.pipeline.sink(results)
 
     def clean_processes(self) -> None:
         for process in self.processes:
@@ -114,7 +96,7 @@ class AutoriaScraper:
 
         self.run_db_thread()
 
-        scraper = Scraper(self.queue)
+        scraper = Scraper(self.queue, self.db_type)
 
         try:
             while current_page <= self.pages:
@@ -138,4 +120,8 @@ class AutoriaScraper:
             for process in self.processes:
                 process.join()
 
+            self.queue.put(None)
+            self.db_thread.join()
+
             scraper_logger.info("Finished parsing")
+            self.pipeline.log_stats()
@@ -1,39 +1,36 @@
-from parsel import Selector
-import requests
-from urllib.parse import urljoin
-from typing import List, Literal
+from typing import List
 import threading
 import time
-from requests.exceptions import ChunkedEncodingError
 
+from autoria.pipeline import Pipeline
 from database.dal import CarDAL
+from database.db_layer import DBType
 from utils.dto import Car
-from parsers.parser import AutoriaParser, AutoriaParserV1
-from utils.exceptions import (
-    EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
-)
+from utils.exceptions import EmptyPageException
 from utils.log import get_logger
 import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 scraper_logger = get_logger("AutoriaScraper")
 
 
 class AutoriaScraper:
 
-    def __init__(self, db_type: Literal['postgresql', 'mongodb']) -> None:
+    def __init__(
+        self,
+        db_type: DBType,
+        pages: int = envs.PAGES,
+        max_threads: int = 21,
+    ) -> None:
         self.results: List[Car] = []
-        self.pages = envs.PAGES
+        self.pages = pages
 
         self.threads: List[threading.Thread] = []
-        self.max_threads = 21
+        self.max_threads = max_threads
 
         self.db_is_busy = False
-        self.db: CarDAL = CarDAL(db_type)
+        self.pipeline: Pipeline = Pipeline(db_type)
+        self.db: CarDAL = self.pipeline.db
 
     def start_db_thread(self) -> None:
         self.db_thread = threading.Thread(
@@ -56,7 +53,7 @@ class AutoriaScraper:
             for item in self.results[:]:
                 self.results.remove(item)
                 results.append(item)
-            self.db.process_items(results)
+            self.pipeline.sink(results)
 
     def clean_threads(self) -> None:
         for thread in self.threads:
@@ -67,32 +64,19 @@ class AutoriaScraper:
         self,
         page_number: int,
     ) -> None:
-        page = self.get_page(
-            urljoin(BASE_URL, f"?page={page_number}")
-        )
-
         scraper_logger.info(f"Parsing page {page_number}")
 
-        urls = AutoriaParser.get_urls(page)
-        cars_number = len(urls)
-        for url in urls:
-            detailed_page = self.get_page(url)
-            page = Selector(text=detailed_page)
-
-            if not page.xpath("//*[contains(@class, 'phone_show_link')]"):
-                scraper_logger.info("Skipped page with new design.")
-                continue
-            else:
-                parser = AutoriaParserV1(detailed_page, url)
-
-            try:
-                self.results.append(
-                    parser.parse_detail_page()
-                )
-            except (SoldException, NoVinException, NoUsernameException):
-                cars_number -= 1
+        cars_number = 0
+        for url in self.pipeline.iter_urls(page_number):
+            detailed_page = self.pipeline.fetch(url)
+            if detailed_page is None:
                 continue
 
+            car = self.pipeline.parse_unique(detailed_page, url)
+            if car is not None:
+                self.results.append(car)
+                cars_number += 1
+
         scraper_logger.info(
             f"Finished parsing page {page_number}. Cars number: {cars_number}."
         )
@@ -126,25 +110,13 @@ class AutoriaScraper:
             for thread in self.threads:
                 thread.join()
 
-            while self.db_is_busy:
+            while self.results or self.db_is_busy:
                 time.sleep(0.1)
 
             scraper_logger.info("Finished parsing")
-
-    @classmethod
-    def get_page(self, url: str) -> str:
-        while True:
-            try:
-                response = requests.get(url, stream=False).text
-            except ChunkedEncodingError:
-                continue
-
-            if AutoriaParser.validate(response):
-                return response
-
-            time.sleep(1)
+            self.pipeline.log_stats()
 
 
 if __name__ == "__main__":
-    scraper = AutoriaScraper("postgresql")
+    scraper = AutoriaScraper(envs.DB_TYPE)
     scraper.run()
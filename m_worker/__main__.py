@@ -1,63 +1,52 @@
 import asyncio
-from typing import List
-import json
-from dataclasses import asdict
+from collections import Counter
+from typing import List, Optional
+import aiohttp
 from playwright.async_api import (
     async_playwright,
+    Error as PlaywrightError,
     Playwright,
     Browser,
-    BrowserContext,
-    Page
+    BrowserContext
 )
-from urllib.parse import urljoin
+from redis import RedisError
 
-from utils.dto import Task, Result
-from utils.cache import AsyncCache
+from m_worker.pool import PagePool
+from utils.dto import ParseOutcome, ParseResult, ParseStats, Task, Result
+from utils.fetch import async_fetch_page
+from utils.task_queue import ClaimedTask, WorkerQueue
+from utils.rate_limit import Endpoint, async_throttle
 from utils.log import get_logger
 from utils.exceptions import (
+    CacheMissException,
     EmptyPageException,
-    NoVinException,
-    SoldException,
-    NoUsernameException
+    PageTooLargeException
 )
-from parsers.parser import AutoriaParser, AutoriaParserV1, AutoriaParserV2
-from utils.encoders import DateTimeEncoder
+from autoria.pipeline import Pipeline
+from parsers.parser import AutoriaParser
+import envs
 
 
-BASE_URL = "https://auto.ria.com/uk/car/used/"
 worker_logger = get_logger("Worker")
 
 
 class Worker:
     def __init__(self) -> None:
-        self.tasks: List[Task] = []
-        self.results: List[Result] = []
-        self.cache_0: AsyncCache = AsyncCache(0)
+        self.queue: WorkerQueue = WorkerQueue()
 
         self.asyncio_tasks: List[asyncio.Task] = []
-        self.max_tasks: int = 2
+        self.max_tasks: int = envs.WORKER_PREFETCH
+        self.poll_interval: float = 1.0
+        self.heartbeat_interval: float = envs.LEASE_TTL / 3
 
         self.playwright: Playwright = None
         self.browser: Browser = None
         self.context: BrowserContext = None
-
-    async def get_tasks(self) -> None:
-        redis_result = await self.cache_0.red.rpop("tasks_queue")
-        while redis_result:
-            self.tasks.append(
-                Task(
-                    **json.loads(redis_result)
-                )
-            )
-            redis_result = await self.cache_0.red.rpop("tasks_queue")
-
-    async def save_results(self) -> None:
-        for result in self.results[:]:
-            await self.cache_0.red.lpush(
-                "results_queue",
-                json.dumps(asdict(result), cls=DateTimeEncoder)
-            )
-            self.results.remove(result)
+        self.pages: PagePool = None
+        self.session: aiohttp.ClientSession = None
+        self.http_first: bool = envs.WORKER_HTTP_FIRST
+        # Pages served by plain HTTP ("http") or rendered ("browser")
+        self.fetches: Counter = Counter()
 
     async def start_playwright(self) -> None:
         self.playwright = await async_playwright().start()
@@ -65,28 +54,103 @@ class Worker:
             headless=True,
         )
         self.context = await self.browser.new_context()
-        worker_logger.info("Started Playwright")
+        self.pages = PagePool(self.context, envs.WORKER_PAGES)
+        await self.pages.open()
+        worker_logger.info(
+            f"Started Playwright with {envs.WORKER_PAGES} pages"
+        )
 
     async def stop_playwright(self) -> None:
+        await self.pages.close()
         await self.context.close()
         await self.browser.close()
         await self.playwright.stop()
         worker_logger.info("Playwright was shut down")
 
     def clean_asyncio_tasks(self) -> None:
-        for task in self.asyncio_tasks:
-            if task.done():
-                try:
-                    task.result()
-                except EmptyPageException:
-                    return True
-                self.asyncio_tasks.remove(task)
-
-    async def process_page(self, page: Page, task: Task) -> None:
-        page_number = task.page_number
-        await page.goto(urljoin(BASE_URL, f"?page={page_number}"))
+        for task in [task for task in self.asyncio_tasks if task.done()]:
+            self.asyncio_tasks.remove(task)
+            if not task.cancelled() and task.exception():
+                worker_logger.error(f"Task failed: {task.exception()!r}")
+
+    async def send_heartbeats(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.queue.heartbeat()
+            except RedisError as e:
+                worker_logger.error(f"Heartbeat failed: {e}")
+
+    async def fetch_http(self, url: str, endpoint: Endpoint) -> Optional[str]:
+        """
+        The page over plain HTTP, None when it is incomplete (the page
+        markers are missing) or the request failed.
+        """
+        if not self.http_first:
+            return None
+        try:
+            return await async_fetch_page(
+                self.session, url, endpoint=endpoint
+            )
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            CacheMissException,
+            PageTooLargeException,
+        ) as e:
+            worker_logger.debug(f"HTTP fetch of {url} failed: {e!r}")
+            return None
+
+    async def render(self, url: str, endpoint: Endpoint) -> str:
+        self.fetches["browser"] += 1
+        await async_throttle(endpoint)
+        return await self.pages.content(url)
+
+    async def fetch_list_page(self, url: str) -> str:
+        html = await self.fetch_http(url, "list")
+        if html is not None:
+            self.fetches["http"] += 1
+            return html
+        return await self.render(url, "list")
+
+    async def fetch_and_parse(self, url: str) -> ParseResult:
+        html = await self.fetch_http(url, "detail")
+        if html is not None:
+            # Parsing may block on the phone request, other pages go on
+            result = await asyncio.to_thread(Pipeline.parse, html, url)
+            if result.outcome != ParseOutcome.UNKNOWN_DESIGN:
+                self.fetches["http"] += 1
+                return result
+
+        html = await self.render(url, "detail")
+        return await asyncio.to_thread(Pipeline.parse, html, url)
+
+    async def parse_detail(self, url: str) -> ParseResult:
+        """
+        One listing that fails to load or parse is counted as failed, the
+        other cars of the page are kept.
+        """
+        try:
+            return await self.fetch_and_parse(url)
+        except PlaywrightError as e:
+            worker_logger.warning(f"Failed to load {url}: {e}")
+        except Exception as e:
+            worker_logger.exception(f"Failed to parse {url}: {e!r}")
+        return ParseResult(ParseOutcome.FAILED)
+
+    def escalation_summary(self) -> str:
+        total = sum(self.fetches.values())
+        rate = self.fetches["browser"] / total if total else 0
+        return (
+            f"Rendered {self.fetches['browser']} of {total} pages "
+            f"in the browser ({rate:.1%})"
+        )
 
-        content = await page.content()
+    async def process_page(self, task: Task) -> List[Result]:
+        page_number = task.page_number
+        content = await self.fetch_list_page(
+            Pipeline.list_page_url(page_number)
+        )
 
         if not AutoriaParser.check_list_page(content):
             worker_logger.warning("Got empty page. Skipping...")
@@ -96,62 +160,70 @@ class Worker:
 
         worker_logger.info(f"Parsing page {page_number}")
 
-        for url in urls:
-            await page.goto(url)
-
-            if await page.query_selector(
-                "//*[contains(@class, 'phone_show_link')]"
-            ):
-                content = await page.content()
-                parser = AutoriaParserV1(content, url)
-            else:
-                print("Skipped page with new design:", url)
-                print(
-                    await page.query_selector(
-                        "(//div[@class='sellerInfoHiddenPhone']"
-                        "//button[@class='s1 conversion'])[1]"
-                    )
-                )
-                continue
+        results = []
+        stats = ParseStats()
+        for result in await asyncio.gather(
+            *(self.parse_detail(url) for url in urls)
+        ):
+            stats.add(result.outcome, result.design)
+            if result.car is not None:
+                results.append(Result(task.id, result.car))
+
+        worker_logger.info(
+            f"Finished parsing page {page_number}. {stats.summary()}. "
+            f"{self.escalation_summary()}"
+        )
+        return results
 
-            try:
-                self.results.append(
-                    Result(
-                        task.id,
-                        parser.parse_detail_page()
-                    )
+    async def run_asyncio_task(self, claimed: ClaimedTask) -> None:
+        empty = False
+        try:
+            results = await self.process_page(claimed.task)
+        except EmptyPageException:
+            results = []
+            empty = True
+        except BaseException as error:
+            # Hand the task to another worker instead of waiting for the
+            # lease to run out, a shutdown is not the task's fault
+            await asyncio.shield(
+                self.queue.release(
+                    claimed, failed=isinstance(error, Exception)
                 )
-            except (NoVinException, NoUsernameException, SoldException):
-                continue
-
-        worker_logger.info(f"Finished parsing page {page_number}")
+            )
+            raise
 
-    async def run_asyncio_task(self, task: Task) -> None:
-        page = await self.context.new_page()
-        try:
-            await self.process_page(page, task)
-        finally:
-            await page.close()
+        await self.queue.finish(claimed, results, empty)
 
     async def run(self) -> None:
         await self.start_playwright()
+        self.session = aiohttp.ClientSession()
+        await self.queue.register()
+        heartbeats = asyncio.create_task(self.send_heartbeats())
         try:
             while True:
-                await self.get_tasks()
-
                 self.clean_asyncio_tasks()
 
-                if len(self.asyncio_tasks) < self.max_tasks:
-                    if self.tasks:
-                        task = self.tasks.pop(0)
-                        self.asyncio_tasks.append(
-                            asyncio.create_task(
-                                self.run_asyncio_task(task)
-                            )
-                        )
+                if len(self.asyncio_tasks) >= self.max_tasks:
+                    await asyncio.wait(
+                        self.asyncio_tasks,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    continue
+
+                claimed = await self.queue.claim()
+                if claimed is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
 
-                await self.save_results()
+                self.asyncio_tasks.append(
+                    asyncio.create_task(self.run_asyncio_task(claimed))
+                )
         finally:
+            heartbeats.cancel()
+            for task in self.asyncio_tasks:
+                task.cancel()
+            await asyncio.gather(*self.asyncio_tasks, return_exceptions=True)
+            await self.session.close()
             await self.stop_playwright()
 
 
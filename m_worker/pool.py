@@ -0,0 +1,51 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from playwright.async_api import BrowserContext, Page
+
+
+class PagePool:
+    """
+    A fixed set of pages in one browser context shared by every task of
+    the worker, so detail pages of all active tasks load in parallel.
+    """
+
+    def __init__(self, context: BrowserContext, size: int) -> None:
+        self.context = context
+        self.size = size
+        self.pages: List[Page] = []
+        self.idle: asyncio.Queue = asyncio.Queue()
+
+    async def open(self) -> None:
+        for _ in range(self.size):
+            await self.add_page()
+
+    async def add_page(self) -> None:
+        page = await self.context.new_page()
+        self.pages.append(page)
+        self.idle.put_nowait(page)
+
+    async def close(self) -> None:
+        for page in self.pages:
+            if not page.is_closed():
+                await page.close()
+        self.pages = []
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        page = await self.idle.get()
+        try:
+            yield page
+        finally:
+            if page.is_closed():
+                # A crashed page is replaced, the pool keeps its size
+                self.pages.remove(page)
+                await self.add_page()
+            else:
+                self.idle.put_nowait(page)
+
+    async def content(self, url: str) -> str:
+        async with self.page() as page:
+            await page.goto(url)
+            return await page.content()
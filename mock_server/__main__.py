@@ -0,0 +1,85 @@
+import argparse
+from aiohttp import web
+
+from mock_server.server import (
+    LIST_PATH,
+    PHONES_PATH,
+    MockAutoria,
+    MockSettings,
+    mock_logger
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for auto.ria.com"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--pages", type=int, default=MockSettings.pages)
+    parser.add_argument(
+        "--per-page", type=int, default=MockSettings.per_page
+    )
+    parser.add_argument(
+        "--latency", type=float, default=MockSettings.latency,
+        help="Seconds added to every response"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=MockSettings.jitter,
+        help="Random extra latency, up to this many seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=MockSettings.error_rate,
+        help="Share of pages answered with 503 or a truncated body"
+    )
+    parser.add_argument(
+        "--sold-rate", type=float, default=MockSettings.sold_rate
+    )
+    parser.add_argument(
+        "--duplicate-rate", type=float, default=MockSettings.duplicate_rate,
+        help="Share of detail pages reusing the VIN of another car"
+    )
+    parser.add_argument(
+        "--new-design-rate", type=float,
+        default=MockSettings.new_design_rate,
+        help="Share of detail pages served in the new site design"
+    )
+    parser.add_argument(
+        "--structured-data", action=argparse.BooleanOptionalAction,
+        default=MockSettings.structured_data,
+        help="Embed a JSON-LD Vehicle block in detail pages"
+    )
+    parser.add_argument(
+        "--template", default=MockSettings.template,
+        help="Detail page whose <head> pads synthetic pages to real size"
+    )
+    parser.add_argument("--seed", type=int, default=MockSettings.seed)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings = MockSettings(
+        pages=args.pages,
+        per_page=args.per_page,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        sold_rate=args.sold_rate,
+        duplicate_rate=args.duplicate_rate,
+        new_design_rate=args.new_design_rate,
+        structured_data=args.structured_data,
+        template=args.template,
+        seed=args.seed,
+    )
+    origin = f"http://{args.host}:{args.port}"
+    mock_logger.info(
+        f"Serving on {origin} - "
+        f"BASE_URL={origin}{LIST_PATH} PHONE_URL={origin}{PHONES_PATH}"
+    )
+    web.run_app(
+        MockAutoria(settings).make_app(),
+        host=args.host,
+        port=args.port,
+        print=None,
+    )
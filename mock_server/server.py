@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from aiohttp import web
+
+from utils.log import get_logger
+
+
+LIST_PATH = "/uk/car/used/"
+DETAIL_PATH = "/uk/auto_{slug}_{car_id}.html"
+PHONES_PATH = "/users/phones/"
+STATS_PATH = "/_stats"
+
+BRANDS = (
+    ("bmw_x5", "BMW X5"),
+    ("audi_a6", "Audi A6"),
+    ("toyota_camry", "Toyota Camry"),
+    ("volkswagen_passat", "Volkswagen Passat"),
+    ("skoda_octavia", "Skoda Octavia"),
+)
+
+LIST_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8"></head>
+<body><header class="app-head"></header>
+<div class="content-bar">{tickets}</div>
+<footer class="wrapper-footer"><div class="footer-line-wrap"></div></footer>
+</body></html>"""
+
+TICKET = """<section class="ticket-item "><div class="content-bar-item">
+<a class="m-link-ticket" href="{url}">{title}</a></div></section>"""
+
+DETAIL_PAGE = """<!DOCTYPE html><html><head><meta charset="utf-8">{structured}
+{padding}</head><body><header class="app-head"></header>
+<main class="{sold}">
+<h1 class="head" title="{title}">{title}</h1>
+<div class="price_value"><strong>{price} $</strong></div>
+<div class="base-information bold"><span class="size18">{odometer}</span>
+ тис. км пробіг</div>
+<div class="seller_info_name bold"><a href="#">{username}</a></div>
+<div class="js-user-secure-{car_id}" data-hash="{user_hash}"
+ data-expires="{expires}"><a class="phone_show_link">показати</a></div>
+<div class="carousel-inner"><div><picture>
+<source srcset="{image_url}"></picture></div></div>
+<span class="count"><span class="mhide">з {images_count}</span></span>
+<span class="state-num">{car_number}</span>
+<span class="label-vin">{car_vin}</span>
+</main>
+<footer class="wrapper-footer"><div class="footer-line-wrap"></div></footer>
+<script>
+document.querySelector(".phone_show_link").addEventListener("click",
+function (event) {{
+  var box = event.target.parentNode;
+  fetch("{phones_path}{car_id}?hash=" + box.dataset.hash
+        + "&expires=" + box.dataset.expires)
+    .then(function (response) {{ return response.json(); }})
+    .then(function (data) {{
+      event.target.textContent = data.formattedPhoneNumber;
+    }});
+}});
+</script>
+</body></html>"""
+
+DETAIL_PAGE_V2 = """<!DOCTYPE html><html><head>
+<meta charset="utf-8">{structured}
+{padding}</head><body><header class="app-head"></header>
+<main class="{sold}">
+<h1 class="titleXl">{title}</h1>
+<div id="sidePrice"><strong class="titleL">{price} $</strong></div>
+<div id="basicInfoTableMainInfoLeft0"><span>{odometer} тис. км</span></div>
+<div id="sellerInfoUserName"><span>{username}</span></div>
+<div id="autoPhonePopUpResponse"><button class="s1 conversion">
+<span>{phone_number}</span></button></div>
+<div class="swiper-slide-active"><picture>
+<source srcset="{image_url}"></picture></div>
+<span class="common-badge alpha medium"><span>1</span>
+<span>{images_count}</span></span>
+<div class="car-number"><span>{car_number}</span></div>
+<div id="badgesVinGrid"><span class="common-text body">{car_vin}</span></div>
+</main>
+<footer class="wrapper-footer"><div class="footer-line-wrap"></div></footer>
+</body></html>"""
+
+mock_logger = get_logger("MockServer")
+
+
+@dataclass
+class MockSettings:
+    pages: int = 10
+    per_page: int = 20
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    sold_rate: float = 0.0
+    duplicate_rate: float = 0.0
+    new_design_rate: float = 0.0
+    structured_data: bool = True
+    template: Optional[str] = "tests.html"
+    seed: int = 0
+
+
+class MockAutoria:
+    def __init__(self, settings: MockSettings) -> None:
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.padding = self.load_padding(settings.template)
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def load_padding(template: Optional[str]) -> str:
+        if not template or not os.path.exists(template):
+            return ""
+        with open(template, encoding="utf-8") as file:
+            html = file.read()
+        start, end = html.find("<head>"), html.find("</head>")
+        if start == -1 or end == -1:
+            return ""
+        return html[start + len("<head>"):end]
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(LIST_PATH, self.list_page)
+        app.router.add_get(
+            "/uk/auto_{slug}_{car_id:\\d+}.html", self.detail_page
+        )
+        app.router.add_get(PHONES_PATH + "{user_id}", self.phones)
+        app.router.add_get(STATS_PATH, self.get_stats)
+        app.router.add_delete(STATS_PATH, self.reset_stats)
+        return app
+
+    async def get_stats(self, request: web.Request) -> web.StreamResponse:
+        return web.json_response(dict(self.stats))
+
+    async def reset_stats(self, request: web.Request) -> web.StreamResponse:
+        self.stats.clear()
+        return web.json_response({})
+
+    def chance(self, rate: float) -> bool:
+        return rate > 0 and self.random.random() < rate
+
+    async def delay(self) -> None:
+        latency = self.settings.latency
+        if self.settings.jitter:
+            latency += self.random.uniform(0, self.settings.jitter)
+        if latency:
+            await asyncio.sleep(latency)
+
+    async def html_response(self, html: str) -> web.StreamResponse:
+        await self.delay()
+        if self.chance(self.settings.error_rate):
+            self.stats["errors"] += 1
+            if self.random.random() < 0.5:
+                return web.Response(status=503, text="Service Unavailable")
+            html = html[:len(html) // 2]
+        return web.Response(
+            text=html,
+            content_type="text/html",
+            charset="utf-8",
+        )
+
+    async def list_page(self, request: web.Request) -> web.StreamResponse:
+        page_number = int(request.query.get("page", 1))
+        self.stats["list_pages"] += 1
+        origin = f"{request.scheme}://{request.host}"
+
+        tickets = []
+        if 1 <= page_number <= self.settings.pages:
+            for index in range(self.settings.per_page):
+                car_id = page_number * 1000 + index
+                slug, title = BRANDS[car_id % len(BRANDS)]
+                url = origin + DETAIL_PATH.format(slug=slug, car_id=car_id)
+                tickets.append(TICKET.format(url=url, title=title))
+
+        return await self.html_response(
+            LIST_PAGE.format(tickets="".join(tickets))
+        )
+
+    def car_vin(self, car_id: int) -> str:
+        if self.chance(self.settings.duplicate_rate):
+            car_id = self.random.randint(
+                1000, self.settings.pages * 1000 + self.settings.per_page
+            )
+        digest = hashlib.sha1(str(car_id).encode()).hexdigest().upper()
+        return "WBA" + digest[:14]
+
+    def structured_data(self, car: Dict[str, Any]) -> str:
+        if not self.settings.structured_data:
+            return ""
+        vehicle = {
+            "@context": "https://schema.org",
+            "@type": ["product", "Vehicle"],
+            "name": car["title"],
+            "image": car["image_url"],
+            "mileageFromOdometer": {
+                "@type": "QuantitativeValue",
+                "value": str(car["odometer"] * 1000),
+                "unitCode": "KMT",
+            },
+            "vehicleIdentificationNumber": car["car_vin"],
+            "offers": {
+                "@type": "Offer",
+                "price": str(car["price"]),
+                "priceCurrency": "USD",
+            },
+        }
+        return (
+            '<script type="application/ld+json">'
+            f"{json.dumps(vehicle, ensure_ascii=False)}</script>"
+        )
+
+    async def detail_page(self, request: web.Request) -> web.StreamResponse:
+        car_id = int(request.match_info["car_id"])
+        self.stats["detail_pages"] += 1
+        slug = request.match_info["slug"]
+        title = dict(BRANDS).get(slug, slug)
+
+        new_design = self.chance(self.settings.new_design_rate)
+        sold = "selled-auto" if new_design else "sold-out"
+        template = DETAIL_PAGE_V2 if new_design else DETAIL_PAGE
+
+        car = dict(
+            title=f"{title} {2005 + car_id % 19}",
+            price=5000 + car_id % 40000,
+            odometer=car_id % 300,
+            image_url=f"https://cdn.example.com/photos/{car_id}f.jpg",
+            car_vin=self.car_vin(car_id),
+        )
+        html = template.format(
+            padding=self.padding,
+            structured=self.structured_data(car),
+            sold=sold if self.chance(self.settings.sold_rate) else "",
+            title=car["title"],
+            price=f"{car['price']:,}".replace(",", " "),
+            odometer=car["odometer"],
+            username=f"Seller {car_id % 997}",
+            car_id=car_id,
+            phones_path=PHONES_PATH,
+            user_hash=hashlib.md5(str(car_id).encode()).hexdigest(),
+            expires=2592000,
+            image_url=car["image_url"],
+            images_count=car_id % 30,
+            car_number=f"AA {car_id % 10000:04d} BB",
+            car_vin=car["car_vin"],
+            phone_number=self.phone_number(car_id),
+        )
+        return await self.html_response(html)
+
+    @staticmethod
+    def phone_number(user_id: int) -> str:
+        number = f"{user_id % 10 ** 7:07d}"
+        return f"(067) {number[:3]} {number[3:5]} {number[5:]}"
+
+    async def phones(self, request: web.Request) -> web.StreamResponse:
+        await self.delay()
+        self.stats["phones"] += 1
+        user_id = int(request.match_info["user_id"])
+        return web.json_response(
+            {"formattedPhoneNumber": self.phone_number(user_id)}
+        )
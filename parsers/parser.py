@@ -1,258 +1,359 @@
+import re
 import requests
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
+from dataclasses import fields
 from datetime import datetime
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Pattern, Tuple
 from parsel import Selector
 import json
 
-from utils.dto import Car
+from parsers.selectors import SelectorRegistry
+from parsers.streaming import PAGE_MARKERS, marker_pattern
+from parsers.structured import StructuredData
+from utils.dto import Car, ParseOutcome, ParseResult
+from utils.http_cache import get_response_cache, lookup_cache
+from utils.rate_limit import throttle
 from utils.exceptions import (
+    CacheMissException,
     NoVinException,
     SoldException,
-    NoUsernameException
+    NoUsernameException,
+    NoPhoneException
 )
-
-
-PHONE_URL = "https://auto.ria.com/users/phones/"
+from utils.log import get_logger
+import envs
+
+
+PHONE_URL = envs.PHONE_URL
+
+parser_logger = get_logger("Parser")
+PAGE_MARKER_PATTERNS = [
+    re.compile(marker_pattern(marker)) for marker in PAGE_MARKERS
+]
+
+
+def request_phone(phone_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Phone number JSON through the response cache, so HTTP_CACHE_MODE
+    replay runs stay offline. None when a replay run never recorded it.
+    """
+    cache = get_response_cache()
+    try:
+        cached, is_fresh = lookup_cache(cache, phone_url)
+    except CacheMissException as e:
+        parser_logger.warning(f"Skipping phone number, {e}: {phone_url}")
+        return None
+    if is_fresh:
+        return json.loads(cached.body)
+
+    throttle("phone")
+    response = requests.get(phone_url, stream=False)
+    if cache is not None and response.ok:
+        cache.put(phone_url, response.content, encoding=response.encoding)
+    return json.loads(response.text)
+
+
+LAZY_FIELDS = {
+    field.name for field in fields(Car)
+    if field.name not in ("url", "car_vin", "datetime_found")
+}
+REQUIRED_FIELDS = {
+    "username": ParseOutcome.NO_USERNAME,
+    "phone_number": ParseOutcome.NO_PHONE,
+}
+OUTCOME_EXCEPTIONS = {
+    ParseOutcome.SOLD: SoldException,
+    ParseOutcome.NO_VIN: NoVinException,
+    ParseOutcome.NO_USERNAME: NoUsernameException,
+    ParseOutcome.NO_PHONE: NoPhoneException,
+}
+
+
+class LazyCar:
+    """
+    Created once the page is known to be unsold and to have a VIN, every
+    other Car field (phone lookup included) is read on first access.
+    """
+
+    def __init__(self, parser: "AutoriaParser", car_vin: str) -> None:
+        self.parser = parser
+        self.url = parser.url
+        self.car_vin = car_vin
+        self.datetime_found = datetime.now()
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in LAZY_FIELDS:
+            raise AttributeError(name)
+        value = self.parser.get_field(name)
+        setattr(self, name, value)
+        return value
+
+    def add_responses(self, responses: Dict[str, Any]) -> None:
+        """JSON responses the browser received for this page, by URL."""
+        self.parser.responses.update(responses)
+
+    def try_car(self) -> ParseResult:
+        for name, outcome in REQUIRED_FIELDS.items():
+            if not getattr(self, name):
+                return ParseResult(outcome, design=self.parser.DESIGN)
+        car = Car(
+            **{field.name: getattr(self, field.name) for field in fields(Car)}
+        )
+        return ParseResult(ParseOutcome.PARSED, car, design=self.parser.DESIGN)
 
 
 class AutoriaParser:
+    LIST_SELECTORS = SelectorRegistry({
+        "ticket_item": "//*[contains(@class, 'ticket-item ')]",
+        "urls": (
+            "//*[contains(@class, 'content-bar')]"
+            "//a[contains(@class, 'm-link-ticket')]/@href"
+        ),
+    })
+    SELECTORS: SelectorRegistry
+    SOLD_PATTERN: Pattern[str]
+    # Name the ParserRegistry knows the page design by
+    DESIGN: str
+
     def __init__(self, html: str, url: str) -> None:
-        self.html = Selector(text=html)
+        self.text = html
         self.url = url
+        self.responses: Dict[str, Any] = {}
+
+    @cached_property
+    def html(self) -> Selector:
+        return Selector(text=self.text)
+
+    @cached_property
+    def root(self) -> Any:
+        return self.html.root
+
+    @cached_property
+    def structured(self) -> StructuredData:
+        return StructuredData.from_html(self.text)
+
+    def get_field(self, name: str) -> Any:
+        """
+        Reads a Car field from the JSON-LD block when the page has it,
+        the DOM is only built for fields that need XPath.
+        """
+        getter = getattr(self.structured, f"get_{name}", None)
+        value = getter() if getter is not None else None
+        if value is None:
+            value = getattr(self, f"get_{name}")()
+        return value
+
+    def get_response(self, url: str) -> Optional[Any]:
+        """A captured JSON response from the path of `url`."""
+        path = urlparse(url).path
+        for response_url, body in self.responses.items():
+            if urlparse(response_url).path == path:
+                return body
+        return None
+
+    def get(self, name: str) -> Optional[str]:
+        return self.SELECTORS.get(self.root, name)
+
+    def getall(self, name: str) -> List[str]:
+        return self.SELECTORS.getall(self.root, name)
+
+    def is_sold(self) -> bool:
+        return self.SOLD_PATTERN.search(self.text) is not None
+
+    def try_parse_lazy(self) -> Tuple[ParseOutcome, Optional[LazyCar]]:
+        if self.is_sold():
+            return ParseOutcome.SOLD, None
+        car_vin = self.get_field("car_vin")
+        if not car_vin:
+            return ParseOutcome.NO_VIN, None
+        return ParseOutcome.PARSED, LazyCar(self, car_vin)
+
+    def try_parse_detail_page(self) -> ParseResult:
+        """
+        Non-raising parse, skipped listings come back as an outcome.
+        """
+        outcome, car = self.try_parse_lazy()
+        if car is None:
+            return ParseResult(outcome, design=self.DESIGN)
+        return car.try_car()
+
+    def parse_detail_page(self) -> Car:
+        result = self.try_parse_detail_page()
+        if result.car is None:
+            raise OUTCOME_EXCEPTIONS[result.outcome](result.outcome.value)
+        return result.car
 
     @classmethod
     def validate(cls, html: str):
-        page = Selector(text=html)
-
-        if (
-            page.xpath("//*[contains(@class, 'app-head')]")
-            and page.xpath("//*[contains(@class, 'footer-line-wrap')]")
-        ):
-            return True
-        return False
+        return all(
+            pattern.search(html) for pattern in PAGE_MARKER_PATTERNS
+        )
 
     @classmethod
     def check_list_page(self, html: str):
         page = Selector(text=html)
-        if not page.xpath("//*[contains(@class, 'ticket-item ')]"):
-            return False
-        return True
+        return self.LIST_SELECTORS.exists(page.root, "ticket_item")
 
     @classmethod
-    def get_urls(cls, html: str) -> str:
+    def get_urls(cls, html: str) -> List[str]:
         page = Selector(text=html)
-        return page.xpath(
-            (
-                "//*[contains(@class, 'content-bar')]"
-                "//a[contains(@class, 'm-link-ticket')]/@href"
-            )
-        ).getall()
+        return cls.LIST_SELECTORS.getall(page.root, "urls")
 
 
 class AutoriaParserV1(AutoriaParser):
+    DESIGN = "v1"
+    SOLD_PATTERN = re.compile(marker_pattern("sold-out"))
+    SELECTORS = SelectorRegistry({
+        "title": "//h1[contains(@class, 'head')]//@title",
+        "price_usd": "//div[contains(@class, 'price_value')]//strong/text()",
+        "odometer": "//div[contains(@class, 'base-information')]//span/text()",
+        "username_link": "//*[contains(@class, 'seller_info_name')]//a/text()",
+        "username_text": "//*[contains(@class, 'seller_info_name')]/text()",
+        "user_hash": "//*[starts-with(@class, 'js-user-secure-')]//@data-hash",
+        "user_expires": (
+            "//*[starts-with(@class, 'js-user-secure-')]//@data-expires"
+        ),
+        "image_url": (
+            "//div[contains(@class, 'carousel-inner')]//div//source/@srcset"
+        ),
+        "images_count": (
+            "//span[contains(@class, 'count')]"
+            "//*[contains(@class, 'mhide')]/text()"
+        ),
+        "car_number": "//*[contains(@class, 'state-num')]/text()",
+        "vin_label": "//span[contains(@class, 'label-vin')]//text()",
+        "vin_code": "//span[contains(@class, 'vin-code')]/text()",
+    })
 
     def get_title(self) -> str:
-        return self.html.xpath(
-            "//h1[contains(@class, 'head')]//@title"
-        ).get()
+        return self.get("title")
 
     def get_price_usd(self) -> float:
-        price_usd = self.html.xpath(
-            "//div[contains(@class, 'price_value')]//strong/text()"
-        ).get()
+        price_usd = self.get("price_usd")
         for char in ("$", "грн", "€"):
             price_usd = price_usd.replace(char, "")
         return float(price_usd.strip().replace(" ", ""))
 
     def get_odometer(self) -> float:
-        odometer = self.html.xpath(
-            "//div[contains(@class, 'base-information')]//span/text()"
-        ).get()
-        return float(odometer)
-
-    def get_username(self) -> str:
-        username = (
-            self.html.xpath(
-                "//*[contains(@class, 'seller_info_name')]//a/text()"
-            ).get(),
-            self.html.xpath(
-                "//*[contains(@class, 'seller_info_name')]/text()"
-            ).get()
-        )
+        return float(self.get("odometer"))
+
+    def get_username(self) -> Optional[str]:
+        username = (self.get("username_link"), self.get("username_text"))
         if username[0]:
             return username[0].strip()
         elif username[1]:
             return username[1].strip()
+        return None
 
-        raise NoUsernameException("Unable to parse the username!")
-
-    def get_phone_number(self) -> str:
+    def get_phone_number(self) -> Optional[str]:
         user_id = self.url.replace(".html", "").split("_")[-1]
-        user_hash = self.html.xpath(
-            "//*[starts-with(@class, 'js-user-secure-')]//@data-hash"
-        ).get()
-        expires = self.html.xpath(
-            "//*[starts-with(@class, 'js-user-secure-')]//@data-expires"
-        ).get()
-        phone_url = urljoin(
-            PHONE_URL, f"{user_id}?hash={user_hash}&expires={expires}"
-        )
-        response = json.loads(
-            requests.get(phone_url, stream=False).text
-        )["formattedPhoneNumber"]
-        return "+38" + response
+        response = self.get_response(urljoin(PHONE_URL, user_id))
+        if response is None:
+            user_hash = self.get("user_hash")
+            expires = self.get("user_expires")
+            phone_url = urljoin(
+                PHONE_URL, f"{user_id}?hash={user_hash}&expires={expires}"
+            )
+            response = request_phone(phone_url)
+            if response is None:
+                return None
+        return "+38" + response["formattedPhoneNumber"]
 
     def get_image_url(self) -> str:
-        return self.html.xpath(
-            (
-                "//div[contains(@class, 'carousel-inner')]"
-                "//div//source/@srcset"
-            )
-        ).get()
+        return self.get("image_url")
 
     def get_images_count(self) -> int:
-        count = self.html.xpath(
-            (
-                "//span[contains(@class, 'count')]"
-                "//*[contains(@class, 'mhide')]/text()"
-            )
-        ).get()
+        count = self.get("images_count")
         if count:
             return int(count.split()[1])
         return 0
 
     def get_car_number(self) -> str:
-        car_number = self.html.xpath(
-            "//*[contains(@class, 'state-num')]/text()"
-        ).get()
+        car_number = self.get("car_number")
         if car_number:
             car_number = car_number.strip()
         return car_number
 
-    def get_car_vin(self) -> str:
-        car_vin = (
-            self.html.xpath(
-                "//span[contains(@class, 'label-vin')]//text()"
-            ).get(),
-            self.html.xpath(
-                "//span[contains(@class, 'vin-code')]/text()"
-            ).get(),
-        )
+    def get_car_vin(self) -> Optional[str]:
+        car_vin = (self.get("vin_label"), self.get("vin_code"))
 
         if car_vin[0]:
             return car_vin[0].strip()
         elif car_vin[1]:
             return car_vin[1].strip()
-
-        raise NoVinException("Vehicle doesnt have vin-code")
-
-    def parse_detail_page(self) -> Car:
-
-        if self.html.xpath("//*[contains(@class, 'sold-out')]"):
-            raise SoldException("Vehicle already sold!")
-
-        return Car(
-            url=self.url,
-            title=self.get_title(),
-            price_usd=self.get_price_usd(),
-            odometer=self.get_odometer(),
-            username=self.get_username(),
-            phone_number=self.get_phone_number(),
-            image_url=self.get_image_url(),
-            images_count=self.get_images_count(),
-            car_number=self.get_car_number(),
-            car_vin=self.get_car_vin(),
-            datetime_found=datetime.now()
-        )
+        return None
 
 
 class AutoriaParserV2(AutoriaParser):
+    DESIGN = "v2"
+    SOLD_PATTERN = re.compile(marker_pattern("selled-auto"))
+    SELECTORS = SelectorRegistry({
+        "title": "//h1[contains(@class, 'titleXl')]/text()",
+        "price_usd": (
+            "//div[@id='sidePrice']//strong[contains(@class, 'titleL')]/text()"
+        ),
+        "odometer": "//div[@id='basicInfoTableMainInfoLeft0']//span/text()",
+        "username": "//div[@id='sellerInfoUserName']//span/text()",
+        "phone_number": (
+            "//div[@id='autoPhonePopUpResponse']"
+            "//button[@class='s1 conversion']//span/text()"
+        ),
+        "image_url": (
+            "//div[contains(@class, 'swiper-slide-active')]//source/@srcset"
+        ),
+        "images_count": (
+            "//span[@class='common-badge alpha medium']//span/text()"
+        ),
+        "car_number": "//div[contains(@class, 'car-number')]//span/text()",
+        "car_vin": (
+            "//*[@id='badgesVinGrid']"
+            "//span[contains(@class, 'common-text body')]//text()"
+        ),
+    })
 
     def get_title(self) -> str:
-        return self.html.xpath(
-            "//h1[contains(@class, 'titleXl')]/text()"
-        ).get()
+        return self.get("title")
 
     def get_price_usd(self) -> float:
-        price_usd = self.html.xpath(
-            "//div[@id='sidePrice']//strong[contains(@class, 'titleL')]/text()"
-        ).get()
+        price_usd = self.get("price_usd")
         for char in ("$", "грн", "€"):
             price_usd = price_usd.replace(char, "")
         return float(price_usd.strip().replace(" ", ""))
 
     def get_odometer(self) -> float:
-        odometer = self.html.xpath(
-            "//div[@id='basicInfoTableMainInfoLeft0']//span/text()"
-        ).get().split()[0]
-        return float(odometer)
-
-    def get_username(self) -> str:
-        username = self.html.xpath(
-            "//div[@id='sellerInfoUserName')]//span/text()"
-        ).get(),
-        return username.strip()
-
-    def get_phone_number(self) -> str:
-        phone_number = self.html.xpath(
-            "(//div[@id='autoPhonePopUpResponse')]"
-            "//button[@class='s1 conversion']//span/text()"
-        ).get()
+        return float(self.get("odometer").split()[0])
+
+    def get_username(self) -> Optional[str]:
+        username = self.get("username")
+        if username:
+            return username.strip()
+        return None
 
-        return "+38" + phone_number
+    def get_phone_number(self) -> Optional[str]:
+        phone_number = self.get("phone_number")
+        if not phone_number:
+            return None
+        return "+38" + phone_number.strip()
 
     def get_image_url(self) -> str:
-        return self.html.xpath(
-            (
-                "//div[contains(@class, 'swiper-slide-active')]"
-                "//source/@srcset"
-            )
-        ).get()
+        return self.get("image_url")
 
     def get_images_count(self) -> int:
-        count = self.html.xpath(
-            (
-                "//span[@class='common-badge alpha medium')]"
-                "//span/text()"
-            )
-        ).getall()
+        count = self.getall("images_count")
         if count:
             return int(count[1])
         return 0
 
     def get_car_number(self) -> str:
-        car_number = self.html.xpath(
-            "//div[contains(@class, 'car-number')]//span/text()"
-        ).get()
+        car_number = self.get("car_number")
         if car_number:
             car_number = car_number.strip()
         return car_number
 
-    def get_car_vin(self) -> str:
-        car_vin = self.html.xpath(
-            "//*[@id='badgesVinGrid')]"
-            "//span[contains(@class, 'common-text body')//text()"
-        ).get()
+    def get_car_vin(self) -> Optional[str]:
+        car_vin = self.get("car_vin")
 
         if car_vin:
             return car_vin.strip()
         return car_vin
-
-    def parse_detail_page(self) -> Car:
-
-        if self.html.xpath("//*[contains(@class, 'selled-auto')]"):
-            raise SoldException("Vehicle already sold!")
-
-        return Car(
-            url=self.url,
-            title=self.get_title(),
-            price_usd=self.get_price_usd(),
-            odometer=self.get_odometer(),
-            username=self.get_username(),
-            phone_number=self.get_phone_number(),
-            image_url=self.get_image_url(),
-            images_count=self.get_images_count(),
-            car_number=self.get_car_number(),
-            car_vin=self.get_car_vin(),
-            datetime_found=datetime.now()
-        )
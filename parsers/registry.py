@@ -0,0 +1,45 @@
+from typing import Dict, List, Optional, Tuple, Type
+
+from parsers.parser import AutoriaParser, AutoriaParserV1, AutoriaParserV2
+
+
+UNKNOWN_DESIGN = "unknown"
+
+
+class ParserRegistry:
+    """
+    Picks the parser version for a detail page by plain substring checks
+    on the raw HTML, no DOM is built until the version is known.
+    Versions are tried in registration order.
+    """
+
+    def __init__(self) -> None:
+        self.versions: List[Tuple[str, Tuple[str, ...]]] = []
+        self.parsers: Dict[str, Type[AutoriaParser]] = {}
+
+    def register(
+        self,
+        markers: Tuple[str, ...],
+        parser: Type[AutoriaParser]
+    ) -> None:
+        self.versions.append((parser.DESIGN, markers))
+        self.parsers[parser.DESIGN] = parser
+
+    def classify(self, html: str) -> Optional[str]:
+        for version, markers in self.versions:
+            if any(marker in html for marker in markers):
+                return version
+        return None
+
+    def get_parser(self, html: str, url: str) -> Optional[AutoriaParser]:
+        version = self.classify(html)
+        if version is None:
+            return None
+        return self.parsers[version](html, url)
+
+
+parser_registry = ParserRegistry()
+parser_registry.register(("phone_show_link",), AutoriaParserV1)
+parser_registry.register(
+    ("sellerInfoUserName", "autoPhonePopUpResponse"), AutoriaParserV2
+)
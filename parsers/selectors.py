@@ -0,0 +1,39 @@
+from typing import Dict, List, Optional
+from lxml import etree
+
+
+EMPTY_DOCUMENT = etree.fromstring("<html><body/></html>")
+
+
+class SelectorRegistry:
+    """
+    XPath expressions of one parser version, compiled once at import.
+    Each one is also evaluated against an empty document, so a malformed
+    selector fails on import instead of on every page.
+    """
+
+    def __init__(self, expressions: Dict[str, str]) -> None:
+        self.expressions = expressions
+        self.compiled: Dict[str, etree.XPath] = {}
+
+        for name, expression in expressions.items():
+            try:
+                selector = etree.XPath(expression)
+                selector(EMPTY_DOCUMENT)
+            except etree.XPathError as e:
+                raise ValueError(
+                    f"Invalid selector {name}: {expression}"
+                ) from e
+            self.compiled[name] = selector
+
+    def exists(self, root: etree._Element, name: str) -> bool:
+        return bool(self.compiled[name](root))
+
+    def get(self, root: etree._Element, name: str) -> Optional[str]:
+        result = self.compiled[name](root)
+        if not result:
+            return None
+        return str(result[0])
+
+    def getall(self, root: etree._Element, name: str) -> List[str]:
+        return [str(value) for value in self.compiled[name](root)]
@@ -0,0 +1,137 @@
+import codecs
+import re
+from typing import List, Optional, Pattern, Tuple
+from lxml import etree
+
+from utils.exceptions import PageTooLargeException
+
+
+PAGE_MARKERS: Tuple[str, ...] = ("app-head", "footer-line-wrap")
+MARKER_OVERLAP = 512
+
+
+def marker_pattern(marker: str) -> str:
+    return r"""class=["'][^"'>]*""" + re.escape(marker)
+
+
+class PageMarkerScanner:
+    """
+    Byte-level equivalent of AutoriaParser.validate, fed chunk by chunk.
+    A tail of every chunk is kept so markers split between chunks are found.
+    """
+
+    def __init__(self, markers: Tuple[str, ...] = PAGE_MARKERS) -> None:
+        self.missing: List[Pattern[bytes]] = [
+            re.compile(marker_pattern(marker).encode())
+            for marker in markers
+        ]
+        self.tail: bytes = b""
+
+    def feed(self, chunk: bytes) -> None:
+        if not self.missing:
+            return
+        window = self.tail + chunk
+        self.missing = [
+            pattern for pattern in self.missing
+            if not pattern.search(window)
+        ]
+        self.tail = window[-MARKER_OVERLAP:]
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.missing
+
+
+class StreamingPage:
+    def __init__(self, max_size: int, decode: bool = True) -> None:
+        self.max_size = max_size
+        self.decode = decode
+        self.size = 0
+        self.encoding: Optional[str] = None
+        self.decoder: Optional[codecs.IncrementalDecoder] = None
+        self.parts: List[str] = []
+        self.scanner = PageMarkerScanner()
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise PageTooLargeException(
+                f"Page exceeds {self.max_size} bytes"
+            )
+        self.scanner.feed(chunk)
+        if not self.decode:
+            return
+        if self.decoder is None:
+            self.decoder = codecs.getincrementaldecoder(
+                self.encoding or "utf-8"
+            )(errors="replace")
+        self.parts.append(self.decoder.decode(chunk))
+
+    @property
+    def is_valid(self) -> bool:
+        return self.scanner.is_valid
+
+    def text(self) -> str:
+        if self.decoder is not None:
+            self.parts.append(self.decoder.decode(b"", final=True))
+            self.decoder = None
+        text = "".join(self.parts)
+        self.parts = [text]
+        return text
+
+
+class ListPageLinkExtractor:
+    """
+    Incremental replacement for AutoriaParser.get_urls: feed raw chunks of
+    the list page as they arrive and collect detail page urls without
+    waiting for the whole document.
+    """
+
+    def __init__(self, encoding: Optional[str] = "utf-8") -> None:
+        self.parser = etree.HTMLPullParser(
+            events=("start", "end"),
+            encoding=encoding,
+        )
+        self.content_bars: List[etree._Element] = []
+        self.urls: List[str] = []
+        self.is_list_page: bool = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        self.parser.feed(chunk)
+        return self.read_urls()
+
+    def close(self) -> List[str]:
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        return self.read_urls()
+
+    def read_urls(self) -> List[str]:
+        urls = []
+        for event, element in self.parser.read_events():
+            classes = element.get("class") or ""
+
+            if event == "end":
+                if self.content_bars and element is self.content_bars[-1]:
+                    self.content_bars.pop()
+                if not self.content_bars:
+                    element.clear()
+                continue
+
+            if "ticket-item " in classes:
+                self.is_list_page = True
+
+            if "content-bar" in classes:
+                self.content_bars.append(element)
+            elif (
+                self.content_bars
+                and element.tag == "a"
+                and "m-link-ticket" in classes
+            ):
+                href = element.get("href")
+                if href:
+                    urls.append(href)
+
+        self.urls.extend(urls)
+        return urls
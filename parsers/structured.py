@@ -0,0 +1,104 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+
+LD_JSON_PATTERN = re.compile(
+    r"""<script[^>]*type=["']application/ld\+json["'][^>]*>(.*?)</script>""",
+    re.DOTALL | re.IGNORECASE,
+)
+VEHICLE_TYPES = {"vehicle", "car", "product"}
+MILE = 1.609344
+
+
+def iter_ld_json(html: str) -> Iterator[Dict[str, Any]]:
+    for match in LD_JSON_PATTERN.finditer(html):
+        try:
+            data = json.loads(match.group(1), strict=False)
+        except ValueError:
+            continue
+
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            yield item
+            for nested in item.get("@graph", ()):
+                if isinstance(nested, dict):
+                    yield nested
+
+
+def item_types(item: Dict[str, Any]) -> List[str]:
+    types = item.get("@type", ())
+    if isinstance(types, str):
+        types = [types]
+    return [str(kind).lower() for kind in types]
+
+
+def find_vehicle(html: str) -> Optional[Dict[str, Any]]:
+    for item in iter_ld_json(html):
+        types = item_types(item)
+        if "vehicle" in types or "car" in types:
+            return item
+        if VEHICLE_TYPES.intersection(types) and "offers" in item:
+            return item
+    return None
+
+
+class StructuredData:
+    """
+    Car fields read from the JSON-LD Vehicle block of a detail page.
+    Every getter returns None when the block lacks the field, so callers
+    can fall back to XPath per field.
+    """
+
+    def __init__(self, vehicle: Optional[Dict[str, Any]]) -> None:
+        self.vehicle = vehicle or {}
+
+    @classmethod
+    def from_html(cls, html: str) -> "StructuredData":
+        return cls(find_vehicle(html))
+
+    def offer(self) -> Dict[str, Any]:
+        offers = self.vehicle.get("offers") or {}
+        if isinstance(offers, list):
+            offers = offers[0] if offers else {}
+        return offers
+
+    def get_title(self) -> Optional[str]:
+        name = self.vehicle.get("name")
+        return name.strip() if isinstance(name, str) else None
+
+    def get_price_usd(self) -> Optional[float]:
+        offer = self.offer()
+        if offer.get("priceCurrency") != "USD":
+            return None
+        try:
+            return float(str(offer.get("price")).replace(" ", ""))
+        except ValueError:
+            return None
+
+    def get_odometer(self) -> Optional[float]:
+        mileage = self.vehicle.get("mileageFromOdometer")
+        if not isinstance(mileage, dict):
+            return None
+        try:
+            value = float(str(mileage.get("value")).replace(" ", ""))
+        except ValueError:
+            return None
+        if mileage.get("unitCode") == "SMI":
+            value *= MILE
+        # Stored in thousands of km, like the "тис. км" the page shows
+        return value / 1000
+
+    def get_image_url(self) -> Optional[str]:
+        image = self.vehicle.get("image")
+        if isinstance(image, list):
+            image = image[0] if image else None
+        if isinstance(image, dict):
+            image = image.get("url") or image.get("contentUrl")
+        return image if isinstance(image, str) else None
+
+    def get_car_vin(self) -> Optional[str]:
+        vin = self.vehicle.get("vehicleIdentificationNumber")
+        return vin.strip() if isinstance(vin, str) and vin.strip() else None
@@ -0,0 +1,17 @@
+import os
+
+
+# envs exits on missing settings, tests never reach these services
+for name, value in {
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "cars",
+    "POSTGRES_PORT": "5432",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "REDIS_PASSWORD": "redis",
+    "MONGO_URI": "mongodb://localhost:27017/test",
+    "PAGES": "1",
+}.items():
+    os.environ.setdefault(name, value)
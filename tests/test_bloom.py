@@ -0,0 +1,98 @@
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from utils.bloom import (
+    BloomFilter,
+    RedisBloomFilter,
+    VinFilter,
+    bit_positions,
+    optimal_size,
+)
+
+
+VINS = [f"WVWZZZ1JZ{number:08d}" for number in range(500)]
+
+
+def test_optimal_size():
+    # m = -n ln p / ln(2)^2, k = m / n ln 2
+    assert optimal_size(1000, 0.01) == (9586, 7)
+    assert optimal_size(10_000_000, 0.001) == (143775876, 10)
+
+
+def test_bit_positions_are_stable_and_in_range():
+    positions = bit_positions("WVWZZZ1JZ00000001", 9586, 7)
+
+    assert positions == bit_positions("WVWZZZ1JZ00000001", 9586, 7)
+    assert len(positions) == 7
+    assert all(0 <= position < 9586 for position in positions)
+    assert positions != bit_positions("WVWZZZ1JZ00000002", 9586, 7)
+
+
+def test_local_filter_error_rate():
+    size, hashes = optimal_size(len(VINS), 0.01)
+    local = BloomFilter(size, hashes)
+    for vin in VINS:
+        local.add(vin)
+
+    assert all(vin in local for vin in VINS)
+    misses = sum(f"UNSEEN{number}" in local for number in range(10_000))
+    assert misses < 300
+
+
+@pytest.fixture
+def red() -> fakeredis.FakeRedis:
+    return fakeredis.FakeRedis()
+
+
+def test_redis_round_trip(red):
+    size, hashes = optimal_size(len(VINS), 0.01)
+    remote = RedisBloomFilter(red, "bloom:test", size, hashes)
+    remote.add_many(VINS)
+
+    local = BloomFilter(size, hashes)
+    remote.load(local)
+
+    expected = BloomFilter(size, hashes)
+    for vin in VINS:
+        expected.add(vin)
+    assert local.bits == expected.bits
+    assert all(vin in remote for vin in VINS[:20])
+
+
+def wait_loaded(vins: VinFilter) -> None:
+    for _ in range(100):
+        vins.might_contain("")
+        if vins.loaded:
+            return
+        time.sleep(0.01)
+    raise AssertionError("VIN filter was not loaded")
+
+
+def test_vin_filter_warms_and_reloads_in_background(red):
+    vins = VinFilter(SimpleNamespace(red=red), capacity=1000, refresh=60)
+
+    # Not warmed yet, everything goes to the database
+    assert vins.might_contain("UNSEEN")
+
+    vins.warm(lambda: [VINS[:250], VINS[250:]])
+    vins.reload_at = 0
+    wait_loaded(vins)
+
+    assert all(vins.might_contain(vin) for vin in VINS)
+    assert not vins.might_contain("UNSEEN")
+
+
+def test_vin_filter_layout_change_needs_new_warm(red):
+    old = VinFilter(SimpleNamespace(red=red), capacity=1000)
+    old.warm(lambda: [VINS])
+
+    resized = VinFilter(SimpleNamespace(red=red), capacity=100_000)
+
+    assert resized.remote.key != old.remote.key
+    assert not red.exists(resized.ready_key)
+    resized.warm(lambda: [VINS])
+    wait_loaded(resized)
+    assert all(resized.might_contain(vin) for vin in VINS)
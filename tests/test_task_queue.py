@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from utils.dto import Task
+from utils.task_queue import (
+    DONE_QUEUE,
+    FAILED_QUEUE,
+    RESULTS_QUEUE,
+    TASKS_QUEUE,
+    WORKERS,
+    TaskQueue,
+    WorkerQueue,
+    processing_key,
+)
+
+
+LEASE_TTL = 0.2
+
+
+@pytest.fixture
+def server() -> fakeredis.FakeServer:
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def queue(server: fakeredis.FakeServer) -> TaskQueue:
+    red = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return TaskQueue(SimpleNamespace(red=red))
+
+
+def make_worker(server: fakeredis.FakeServer, worker_id: str) -> WorkerQueue:
+    red = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return WorkerQueue(
+        SimpleNamespace(red=red), worker_id=worker_id, lease_ttl=LEASE_TTL,
+        max_attempts=3,
+    )
+
+
+def expire_leases() -> None:
+    time.sleep(LEASE_TTL * 1.5)
+
+
+def test_claim_moves_task_under_lease(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def run():
+        await worker.register()
+        return await worker.claim(), await worker.claim()
+
+    claimed, nothing = asyncio.run(run())
+
+    assert claimed.task == Task(1, 1, True, False)
+    assert nothing is None
+    assert queue.pending() == 0
+    assert queue.red.lrange(processing_key("a"), 0, -1) == [claimed.raw]
+    assert queue.red.get("lease:1") == "a"
+    assert queue.red.sismember(WORKERS, "a")
+
+
+def test_heartbeat_keeps_lease_and_registers_worker(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def run():
+        await worker.register()
+        await worker.claim()
+        # The reaper forgets a worker once its key expired
+        queue.red.srem(WORKERS, "a")
+        for _ in range(3):
+            time.sleep(LEASE_TTL / 2)
+            await worker.heartbeat()
+
+    asyncio.run(run())
+
+    assert queue.red.sismember(WORKERS, "a")
+    assert queue.red.get("lease:1") == "a"
+    assert queue.reap() == 0
+
+
+def test_reap_requeues_expired_lease(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def run():
+        await worker.register()
+        return await worker.claim()
+
+    claimed = asyncio.run(run())
+    expire_leases()
+
+    assert queue.reap() == 1
+    [raw] = queue.red.lrange(TASKS_QUEUE, 0, -1)
+    assert json.loads(raw) == {**json.loads(claimed.raw), "attempts": 1}
+    assert queue.red.llen(processing_key("a")) == 0
+    # Worker key expired and its list is empty, so it is forgotten
+    assert not queue.red.sismember(WORKERS, "a")
+
+
+def test_late_finish_after_requeue(server, queue):
+    slow = make_worker(server, "slow")
+    fast = make_worker(server, "fast")
+    queue.push([Task(1, 1, True, False)])
+
+    async def claim_slow():
+        await slow.register()
+        return await slow.claim()
+
+    late = asyncio.run(claim_slow())
+    expire_leases()
+    assert queue.reap() == 1
+
+    async def finish_late():
+        await fast.register()
+        claimed = await fast.claim()
+        await slow.finish(late, [], empty=True)
+        return claimed
+
+    claimed = asyncio.run(finish_late())
+
+    # The late finish reports the task but leaves the new lease alone
+    assert claimed.task.id == 1
+    assert queue.red.get("lease:1") == "fast"
+    assert queue.red.lrange(processing_key("fast"), 0, -1) == [claimed.raw]
+    assert queue.red.llen(processing_key("slow")) == 0
+    done = queue.pop_done()
+    assert done == [
+        {"task_id": 1, "worker_id": "slow", "results": 0, "empty": True}
+    ]
+    assert queue.red.llen(RESULTS_QUEUE) == 0
+
+
+def test_release_puts_task_back(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def run():
+        await worker.register()
+        claimed = await worker.claim()
+        await worker.release(claimed)
+        return claimed
+
+    claimed = asyncio.run(run())
+
+    [raw] = queue.red.lrange(TASKS_QUEUE, 0, -1)
+    assert json.loads(raw) == {**json.loads(claimed.raw), "attempts": 1}
+    assert not queue.red.exists("lease:1")
+    assert queue.red.llen(DONE_QUEUE) == 0
+    assert worker.active == {}
+
+
+def test_release_on_shutdown_keeps_attempts(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def run():
+        await worker.register()
+        claimed = await worker.claim()
+        await worker.release(claimed, failed=False)
+        return claimed
+
+    claimed = asyncio.run(run())
+
+    assert queue.red.lrange(TASKS_QUEUE, 0, -1) == [claimed.raw]
+
+
+def test_task_goes_to_failed_queue_after_max_attempts(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(1, 1, True, False)])
+
+    async def fail_twice():
+        await worker.register()
+        for _ in range(2):
+            await worker.release(await worker.claim())
+        return await worker.claim()
+
+    claimed = asyncio.run(fail_twice())
+    assert claimed.attempts == 2
+    expire_leases()
+
+    # The expired lease is the third attempt
+    assert queue.reap() == 1
+    assert queue.pending() == 0
+    assert queue.in_flight() == {1}
+    [failed] = queue.pop_failed()
+    assert failed["id"] == 1
+    assert failed["attempts"] == 3
+
+
+def test_in_flight_covers_queued_claimed_done_and_failed(server, queue):
+    worker = make_worker(server, "a")
+    queue.push([Task(task_id, task_id, True, False) for task_id in (1, 2)])
+    queue.red.lpush(DONE_QUEUE, json.dumps({"task_id": 3}))
+    queue.red.lpush(FAILED_QUEUE, json.dumps({"id": 4}))
+
+    async def run():
+        await worker.register()
+        await worker.claim()
+
+    asyncio.run(run())
+
+    assert queue.in_flight() == {1, 2, 3, 4}
@@ -0,0 +1,230 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import redis
+
+from utils.cache import Cache
+from utils.log import RateLimitedLog, get_logger
+import envs
+
+
+bloom_logger = get_logger("Bloom")
+redis_warning = RateLimitedLog(bloom_logger, interval=60)
+
+BLOOM_PREFIX = "bloom:vins"
+WARMING_TTL = 60 * 60
+LOAD_CHUNK = 8 * 1024 * 1024
+# After a Redis error every VIN goes to the database for a while
+RETRY_AFTER = 30.0
+# How often a process checks whether the bitmap has been warmed
+READY_POLL = 5.0
+
+
+def optimal_size(capacity: int, error_rate: float) -> Tuple[int, int]:
+    """Bits and hash functions for `capacity` items at `error_rate`."""
+    size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(size / capacity * math.log(2)))
+    return size, hashes
+
+
+def bit_positions(item: str, size: int, hashes: int) -> List[int]:
+    # Double hashing over one stable digest, Python's hash() differs
+    # between processes
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], "big")
+    second = int.from_bytes(digest[8:], "big") | 1
+    return [(first + i * second) % size for i in range(hashes)]
+
+
+class BloomFilter:
+    """
+    In-process bit array laid out like a Redis bitmap (most significant
+    bit first), so it can be loaded straight from GETRANGE.
+    """
+
+    def __init__(self, size: int, hashes: int) -> None:
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    def add(self, item: str) -> None:
+        for position in bit_positions(item, self.size, self.hashes):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (0x80 >> (position & 7))
+            for position in bit_positions(item, self.size, self.hashes)
+        )
+
+
+class RedisBloomFilter:
+    def __init__(
+        self,
+        red: redis.Redis,
+        key: str,
+        size: int,
+        hashes: int
+    ) -> None:
+        self.red = red
+        self.key = key
+        self.size = size
+        self.hashes = hashes
+
+    def add_many(self, items: Iterable[str]) -> None:
+        pipeline = self.red.pipeline(transaction=False)
+        for item in items:
+            for position in bit_positions(item, self.size, self.hashes):
+                pipeline.setbit(self.key, position, 1)
+        pipeline.execute()
+
+    def __contains__(self, item: str) -> bool:
+        pipeline = self.red.pipeline(transaction=False)
+        for position in bit_positions(item, self.size, self.hashes):
+            pipeline.getbit(self.key, position)
+        return all(pipeline.execute())
+
+    def load(self, local: BloomFilter) -> None:
+        bits = bytearray()
+        while len(bits) < len(local.bits):
+            chunk = self.red.getrange(
+                self.key, len(bits), len(bits) + LOAD_CHUNK - 1
+            )
+            if not chunk:
+                break
+            bits += chunk
+        # Redis leaves out the zero tail that was never written
+        bits += bytes(len(local.bits) - len(bits))
+        local.bits = bits
+
+
+def bloom_key(size: int, hashes: int) -> str:
+    # A filter sized differently reads the bits at other positions, so
+    # every layout gets its own bitmap and is warmed on its own
+    return f"{BLOOM_PREFIX}:{size}:{hashes}"
+
+
+class VinFilter:
+    """
+    Seen-VIN Bloom filter shared through a Redis bitmap, with a local
+    copy reloaded in a background thread every `refresh` seconds.
+    might_contain() is False only for VINs that are certainly not in the
+    car table (up to inserts by other processes since the last reload),
+    True means "ask the database". Until the first reload after the
+    bitmap has been warmed from the car table, or while Redis is down,
+    everything is "ask the database".
+    """
+
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        capacity: int = envs.BLOOM_CAPACITY,
+        error_rate: float = envs.BLOOM_ERROR_RATE,
+        refresh: float = envs.BLOOM_REFRESH,
+    ) -> None:
+        self.red = (cache or Cache(envs.REDIS_DB, decode_responses=False)).red
+        size, hashes = optimal_size(capacity, error_rate)
+        key = bloom_key(size, hashes)
+        self.ready_key = f"{key}:ready"
+        self.warming_key = f"{key}:warming"
+        self.remote = RedisBloomFilter(self.red, key, size, hashes)
+        self.local = BloomFilter(size, hashes)
+        self.refresh = refresh
+        self.loaded = False
+        self.reload_at = 0.0
+        self.retry_at = 0.0
+        self.reloading = False
+        self.lock = threading.Lock()
+
+    def warm(self, vin_chunks: Callable[[], Iterable[List[str]]]) -> None:
+        """
+        Fills the Redis bitmap once per Redis instance, other processes
+        skip it while one of them is warming.
+        """
+        try:
+            if self.red.exists(self.ready_key):
+                return
+            if not self.red.set(
+                self.warming_key, 1, nx=True, ex=WARMING_TTL
+            ):
+                return
+
+            bloom_logger.info("Warming the VIN filter from the database")
+            count = 0
+            try:
+                for vins in vin_chunks():
+                    self.remote.add_many(vins)
+                    count += len(vins)
+                self.red.set(self.ready_key, 1)
+            finally:
+                self.red.delete(self.warming_key)
+            bloom_logger.info(f"VIN filter warmed with {count} cars")
+        except redis.RedisError as e:
+            redis_warning("redis", f"VIN filter unavailable: {e}")
+
+    def reload(self) -> None:
+        """
+        Copies the bitmap into a new local filter, callers keep reading
+        the previous one until it is swapped in.
+        """
+        try:
+            if not self.red.exists(self.ready_key):
+                self.reload_at = time.monotonic() + READY_POLL
+                return
+            local = BloomFilter(self.local.size, self.local.hashes)
+            self.remote.load(local)
+            self.local = local
+            self.loaded = True
+            self.reload_at = time.monotonic() + self.refresh
+        except redis.RedisError as e:
+            redis_warning("redis", f"VIN filter unavailable: {e}")
+            self.retry_at = self.reload_at = time.monotonic() + RETRY_AFTER
+        finally:
+            self.reloading = False
+
+    def sync(self) -> None:
+        """Starts a background reload when one is due."""
+        if time.monotonic() < self.reload_at or self.reloading:
+            return
+        with self.lock:
+            if self.reloading:
+                return
+            self.reloading = True
+        threading.Thread(
+            target=self.reload, name="bloom-reload", daemon=True
+        ).start()
+
+    def might_contain(self, vin: str) -> bool:
+        self.sync()
+        if not self.loaded or time.monotonic() < self.retry_at:
+            return True
+        return vin in self.local
+
+    def add(self, vins: Iterable[str]) -> None:
+        vins = list(vins)
+        for vin in vins:
+            self.local.add(vin)
+        try:
+            self.remote.add_many(vins)
+        except redis.RedisError as e:
+            redis_warning("redis", f"VIN filter not updated: {e}")
+
+
+_filter: Optional[VinFilter] = None
+_filter_pid: Optional[int] = None
+
+
+def get_vin_filter() -> Optional[VinFilter]:
+    global _filter, _filter_pid
+
+    if not envs.BLOOM_ENABLED:
+        return None
+
+    if _filter is None or _filter_pid != os.getpid():
+        _filter = VinFilter()
+        _filter_pid = os.getpid()
+    return _filter
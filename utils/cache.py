@@ -9,13 +9,14 @@ class Cache:
         number_db: int,
         host: str = envs.REDIS_HOST,
         port: int = envs.REDIS_PORT,
-        password: str = envs.REDIS_PASSWORD
+        password: str = envs.REDIS_PASSWORD,
+        decode_responses: bool = True
     ) -> None:
         self.red = redis.Redis(
             host=host,
             port=port,
             db=number_db,
-            decode_responses=True
+            decode_responses=decode_responses
         )
 
 
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
 from datetime import datetime
+from enum import Enum
+from typing import Optional
 
 
 @dataclass
@@ -23,11 +26,22 @@ class Task:
     page_number: int
     in_work: bool
     completed: bool
+    cycle: int = 1
 
 
 @dataclass
 class CreateTask:
     page_number: int
+    cycle: int = 1
+
+
+@dataclass
+class CycleState:
+    cycle: int
+    frontier: int
+    boundary: Optional[int]
+    open_tasks: int
+    started: datetime
 
 
 @dataclass
@@ -40,3 +54,53 @@ class Result:
 class CreateResult:
     task_id: int
     car_id: int
+
+
+class ParseOutcome(Enum):
+    PARSED = "parsed"
+    SOLD = "sold"
+    NO_VIN = "no_vin"
+    NO_USERNAME = "no_username"
+    NO_PHONE = "no_phone"
+    UNKNOWN_DESIGN = "unknown_design"
+    DUPLICATE = "duplicate"
+    FAILED = "failed"
+
+
+@dataclass
+class ParseResult:
+    outcome: ParseOutcome
+    car: Optional[Car] = None
+    # Set instead of car by Pipeline.parse_vin, the page still needs the
+    # full parse once the VIN turned out to be new
+    car_vin: Optional[str] = None
+    # Registry name of the page design, None when no page was parsed
+    design: Optional[str] = None
+
+
+@dataclass
+class ParseStats:
+    outcomes: Counter = field(default_factory=Counter)
+    designs: Counter = field(default_factory=Counter)
+
+    def add(self, outcome: ParseOutcome, design: Optional[str] = None) -> None:
+        self.outcomes[outcome] += 1
+        if design is not None:
+            self.designs[design] += 1
+
+    def update(self, other: "ParseStats") -> None:
+        self.outcomes.update(other.outcomes)
+        self.designs.update(other.designs)
+
+    def design_summary(self) -> str:
+        return ", ".join(
+            f"{design}: {count}"
+            for design, count in sorted(self.designs.items())
+        )
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{outcome.value}: {self.outcomes[outcome]}"
+            for outcome in ParseOutcome
+            if self.outcomes[outcome]
+        )
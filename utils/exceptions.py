@@ -1,33 +1,38 @@
-from utils.log import get_logger
+class EmptyPageException(Exception):
+    pass
 
 
-exc_logger = get_logger("Exceptions")
+class NoVinException(Exception):
+    pass
 
 
-class EmptyPageException(Exception):
+class SoldException(Exception):
     pass
 
 
-class NoVinException(Exception):
-    def __init__(self, message: str) -> None:
-        super().__init__(message)
+class NoUsernameException(Exception):
+    pass
 
-        exc_logger.warning("Item without Vin skipped!")
 
+class NoPhoneException(Exception):
+    pass
 
-class SoldException(Exception):
-    def __init__(self, message: str) -> None:
-        super().__init__(message)
 
-        exc_logger.warning("Sold item skipped!")
+class NotLoadedPageException(Exception):
+    pass
 
 
-class NoUsernameException(Exception):
-    def __init__(self, message: str) -> None:
-        super().__init__(message)
+class PageTooLargeException(Exception):
+    pass
+
 
-        exc_logger.warning("Item without username skipped!")
+class CacheMissException(Exception):
+    pass
 
 
-class NotLoadedPageException(Exception):
+class SharedMemoryException(Exception):
+    pass
+
+
+class DumpException(Exception):
     pass
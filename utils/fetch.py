@@ -0,0 +1,296 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Optional, Set, Tuple
+import aiohttp
+import requests
+from requests.exceptions import ChunkedEncodingError
+
+from parsers.parser import AutoriaParser
+from parsers.streaming import ListPageLinkExtractor, StreamingPage
+from utils.exceptions import CacheMissException, PageTooLargeException
+from utils.http_cache import (
+    CachedResponse,
+    get_response_cache,
+    lookup_cache
+)
+from utils.log import get_logger
+from utils.rate_limit import Endpoint, async_throttle, throttle
+import envs
+
+
+CHUNK_SIZE = 16 * 1024
+
+fetch_logger = get_logger("Fetch")
+
+
+def check_content_length(length: Optional[int], max_size: int) -> None:
+    if length is not None and length > max_size:
+        raise PageTooLargeException(
+            f"Content-Length {length} exceeds {max_size} bytes"
+        )
+
+
+def replay_cached(
+    cached: CachedResponse,
+    page: StreamingPage
+) -> Iterator[bytes]:
+    page.encoding = cached.encoding
+    for start in range(0, len(cached.body), CHUNK_SIZE):
+        chunk = cached.body[start:start + CHUNK_SIZE]
+        page.feed(chunk)
+        yield chunk
+
+
+def stream_page(
+    url: str,
+    page: StreamingPage,
+    endpoint: Endpoint = "detail"
+) -> Iterator[bytes]:
+    cache = get_response_cache()
+    cached, is_fresh = lookup_cache(cache, url)
+    if is_fresh:
+        yield from replay_cached(cached, page)
+        return
+
+    throttle(endpoint)
+    headers = cached.conditional_headers() if cached else {}
+    with requests.get(url, stream=True, headers=headers) as response:
+        if cached is not None and response.status_code == 304:
+            cache.touch(url)
+            yield from replay_cached(cached, page)
+            return
+
+        length = response.headers.get("Content-Length")
+        check_content_length(length and int(length), page.max_size)
+
+        chunks: List[bytes] = []
+        page.encoding = response.encoding
+        for chunk in response.iter_content(CHUNK_SIZE):
+            page.feed(chunk)
+            if cache is not None:
+                chunks.append(chunk)
+            yield chunk
+
+    if cache is not None and response.ok and page.is_valid:
+        cache.put(
+            url,
+            b"".join(chunks),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            encoding=page.encoding,
+        )
+
+
+def fetch_page(
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE
+) -> Optional[str]:
+    page = StreamingPage(max_size)
+    for _ in stream_page(url, page):
+        pass
+
+    if not page.is_valid:
+        return None
+    return page.text()
+
+
+def get_page(
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE
+) -> Optional[str]:
+    """
+    Retries until the page loads completely, returns None for a page
+    over max_size or one a replay run never recorded.
+    """
+    while True:
+        try:
+            html = fetch_page(url, max_size)
+        except ChunkedEncodingError:
+            continue
+        except (CacheMissException, PageTooLargeException) as e:
+            # Neither a replay miss nor an oversized page changes on the
+            # next attempt
+            fetch_logger.warning(f"Skipping page, {e}: {url}")
+            return None
+
+        if html is not None:
+            return html
+
+        time.sleep(1)
+
+
+def iter_list_urls(
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE
+) -> Iterator[str]:
+    seen: Set[str] = set()
+    while True:
+        page = StreamingPage(max_size)
+        extractor = ListPageLinkExtractor()
+        try:
+            for chunk in stream_page(url, page, "list"):
+                for href in extractor.feed(chunk):
+                    if href not in seen:
+                        seen.add(href)
+                        yield href
+        except ChunkedEncodingError:
+            continue
+        except (CacheMissException, PageTooLargeException) as e:
+            fetch_logger.warning(f"Skipping page, {e}: {url}")
+            return
+        else:
+            extractor.close()
+            if page.is_valid:
+                # Ticket markup without links means the extractor missed
+                # them, a page without tickets is simply empty
+                if not seen and extractor.is_list_page:
+                    yield from AutoriaParser.get_urls(page.text())
+                return
+
+        time.sleep(1)
+
+
+async def async_stream_page(
+    session: aiohttp.ClientSession,
+    url: str,
+    page: StreamingPage,
+    endpoint: Endpoint = "detail"
+) -> AsyncIterator[bytes]:
+    # SQLite and zlib work on whole pages, they stay off the event loop
+    cache = get_response_cache()
+    cached, is_fresh = await asyncio.to_thread(lookup_cache, cache, url)
+    if is_fresh:
+        for chunk in replay_cached(cached, page):
+            yield chunk
+        return
+
+    await async_throttle(endpoint)
+    headers = cached.conditional_headers() if cached else {}
+    async with session.get(url, headers=headers) as response:
+        if cached is not None and response.status == 304:
+            await asyncio.to_thread(cache.touch, url)
+            for chunk in replay_cached(cached, page):
+                yield chunk
+            return
+
+        check_content_length(response.content_length, page.max_size)
+
+        chunks: List[bytes] = []
+        page.encoding = response.charset
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            page.feed(chunk)
+            if cache is not None:
+                chunks.append(chunk)
+            yield chunk
+
+    if cache is not None and response.ok and page.is_valid:
+        await asyncio.to_thread(
+            cache.put,
+            url,
+            b"".join(chunks),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            encoding=page.encoding,
+        )
+
+
+async def async_fetch_page(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE,
+    endpoint: Endpoint = "detail"
+) -> Optional[str]:
+    page = StreamingPage(max_size)
+    async for _ in async_stream_page(session, url, page, endpoint):
+        pass
+
+    if not page.is_valid:
+        return None
+    return page.text()
+
+
+async def async_fetch_body(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE
+) -> Optional[Tuple[bytes, Optional[str]]]:
+    """
+    The page body and its charset without decoding it, for a parser
+    process that decodes the bytes itself. None when it is incomplete.
+    """
+    page = StreamingPage(max_size, decode=False)
+    chunks = [
+        chunk async for chunk in async_stream_page(session, url, page)
+    ]
+
+    if not page.is_valid:
+        return None
+    return b"".join(chunks), page.encoding
+
+
+@asynccontextmanager
+async def reuse_session(
+    session: Optional[aiohttp.ClientSession]
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """Yields the given session, or a new one closed afterwards."""
+    if session is not None:
+        yield session
+        return
+    async with aiohttp.ClientSession() as session:
+        yield session
+
+
+async def async_get_page(
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE,
+    session: Optional[aiohttp.ClientSession] = None
+) -> Optional[str]:
+    while True:
+        try:
+            async with reuse_session(session) as client:
+                html = await async_fetch_page(client, url, max_size)
+        except aiohttp.ClientPayloadError:
+            continue
+        except (CacheMissException, PageTooLargeException) as e:
+            fetch_logger.warning(f"Skipping page, {e}: {url}")
+            return None
+
+        if html is not None:
+            return html
+
+        await asyncio.sleep(1)
+
+
+async def async_iter_list_urls(
+    url: str,
+    max_size: int = envs.MAX_PAGE_SIZE,
+    session: Optional[aiohttp.ClientSession] = None
+) -> AsyncIterator[str]:
+    seen: Set[str] = set()
+    while True:
+        page = StreamingPage(max_size)
+        extractor = ListPageLinkExtractor()
+        try:
+            async with reuse_session(session) as client:
+                async for chunk in async_stream_page(
+                    client, url, page, "list"
+                ):
+                    for href in extractor.feed(chunk):
+                        if href not in seen:
+                            seen.add(href)
+                            yield href
+        except aiohttp.ClientPayloadError:
+            continue
+        except (CacheMissException, PageTooLargeException) as e:
+            fetch_logger.warning(f"Skipping page, {e}: {url}")
+            return
+        else:
+            extractor.close()
+            if page.is_valid:
+                if not seen and extractor.is_list_page:
+                    for href in AutoriaParser.get_urls(page.text()):
+                        yield href
+                return
+
+        await asyncio.sleep(1)
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from utils.exceptions import CacheMissException
+from utils.log import get_logger
+import envs
+
+
+cache_logger = get_logger("HttpCache")
+
+EVICT_EVERY = 100
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    encoding: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl: int) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str = envs.HTTP_CACHE_PATH,
+        ttl: int = envs.HTTP_CACHE_TTL,
+        max_size: int = envs.HTTP_CACHE_MAX_SIZE,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.puts = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(
+            path,
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS response ("
+            "key TEXT PRIMARY KEY, "
+            "url TEXT NOT NULL, "
+            "body BLOB NOT NULL, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "encoding TEXT, "
+            "size INTEGER NOT NULL, "
+            "fetched_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS response_accessed_at "
+            "ON response (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        key = self.make_key(url)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, etag, last_modified, encoding, fetched_at "
+                "FROM response WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE response SET accessed_at = ? WHERE key = ?",
+                (time.time(), key)
+            )
+
+        body, etag, last_modified, encoding, fetched_at = row
+        return CachedResponse(
+            url=url,
+            body=zlib.decompress(body),
+            etag=etag,
+            last_modified=last_modified,
+            encoding=encoding,
+            fetched_at=fetched_at,
+        )
+
+    def put(
+        self,
+        url: str,
+        body: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        encoding: Optional[str] = None,
+    ) -> None:
+        compressed = zlib.compress(body)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO response "
+                "(key, url, body, etag, last_modified, encoding, size, "
+                "fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.make_key(url), url, compressed, etag,
+                    last_modified, encoding, len(compressed), now, now
+                )
+            )
+            self.puts += 1
+            if self.puts % EVICT_EVERY == 0:
+                self.evict()
+
+    def touch(self, url: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE response SET fetched_at = ?, accessed_at = ? "
+                "WHERE key = ?",
+                (now, now, self.make_key(url))
+            )
+
+    def evict(self) -> None:
+        total = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM response"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        self.connection.execute(
+            "DELETE FROM response WHERE fetched_at < ?",
+            (time.time() - self.ttl,)
+        )
+        rows = self.connection.execute(
+            "SELECT key, size FROM response ORDER BY accessed_at DESC"
+        ).fetchall()
+
+        kept = 0
+        evicted = []
+        for key, size in rows:
+            kept += size
+            if kept > self.max_size:
+                evicted.append((key,))
+        self.connection.executemany(
+            "DELETE FROM response WHERE key = ?", evicted
+        )
+        cache_logger.info(f"Evicted {len(evicted)} cached responses")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_pid: Optional[int] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    global _cache, _cache_pid
+
+    if envs.HTTP_CACHE_MODE == "off":
+        return None
+
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = ResponseCache()
+        _cache_pid = os.getpid()
+    return _cache
+
+
+def lookup_cache(
+    cache: Optional[ResponseCache],
+    url: str
+) -> Tuple[Optional[CachedResponse], bool]:
+    """
+    Returns the cached response for url and whether it may be served
+    without asking the server.
+    """
+    if cache is None:
+        return None, False
+
+    cached = cache.get(url)
+    if envs.HTTP_CACHE_MODE == "replay":
+        if cached is None:
+            raise CacheMissException("not in the replay cache")
+        return cached, True
+
+    return cached, cached is not None and cached.is_fresh(cache.ttl)
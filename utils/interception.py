@@ -0,0 +1,125 @@
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+from playwright.async_api import (
+    Error as AsyncPlaywrightError,
+    Page as AsyncPage,
+    Response as AsyncResponse,
+)
+from playwright.sync_api import (
+    Error as PlaywrightError,
+    Page,
+    Response,
+)
+
+from utils.log import get_logger
+from utils.rate_limit import async_throttle, throttle
+import envs
+
+
+capture_logger = get_logger("Interception")
+
+PHONES_PATH = urlparse(envs.PHONE_URL).path
+PHONE_LINK = "(//*[contains(@class, 'phone_show_link')])[1]"
+PHONE_TIMEOUT = 5000
+XHR_TYPES = ("xhr", "fetch")
+
+
+def is_json_xhr(response: Any) -> bool:
+    return (
+        response.request.resource_type in XHR_TYPES
+        and "json" in response.headers.get("content-type", "")
+    )
+
+
+def is_phone_response(response: Any) -> bool:
+    return urlparse(response.url).path.startswith(PHONES_PATH)
+
+
+class ResponseCapture:
+    """
+    Keeps the XHR JSON responses a page receives so the parser reads
+    them instead of requesting the same data again. clear() before each
+    navigation, collect() once the page is done.
+    """
+
+    def __init__(self, page: Page) -> None:
+        self.page = page
+        self.responses: List[Response] = []
+        page.on("response", self.on_response)
+
+    def on_response(self, response: Response) -> None:
+        if is_json_xhr(response):
+            self.responses.append(response)
+
+    def detach(self) -> None:
+        self.page.remove_listener("response", self.on_response)
+
+    def clear(self) -> None:
+        self.responses = []
+
+    def reveal_phone(self) -> None:
+        """Clicks the phone link and waits for the phone number response."""
+        link = self.page.locator(PHONE_LINK)
+        if not link.count():
+            return
+
+        throttle("phone")
+        try:
+            with self.page.expect_response(
+                is_phone_response, timeout=PHONE_TIMEOUT
+            ):
+                link.click()
+        except PlaywrightError as e:
+            capture_logger.warning(f"No phone response: {e}")
+
+    def collect(self) -> Dict[str, Any]:
+        captured = {}
+        for response in self.responses:
+            try:
+                captured[response.url] = response.json()
+            except (PlaywrightError, ValueError):
+                continue
+        self.clear()
+        return captured
+
+
+class AsyncResponseCapture:
+    def __init__(self, page: AsyncPage) -> None:
+        self.page = page
+        self.responses: List[AsyncResponse] = []
+        page.on("response", self.on_response)
+
+    def on_response(self, response: AsyncResponse) -> None:
+        if is_json_xhr(response):
+            self.responses.append(response)
+
+    def detach(self) -> None:
+        self.page.remove_listener("response", self.on_response)
+
+    def clear(self) -> None:
+        self.responses = []
+
+    async def reveal_phone(self) -> None:
+        link = self.page.locator(PHONE_LINK)
+        if not await link.count():
+            return
+
+        await async_throttle("phone")
+        try:
+            async with self.page.expect_response(
+                is_phone_response, timeout=PHONE_TIMEOUT
+            ):
+                await link.click()
+        except AsyncPlaywrightError as e:
+            capture_logger.warning(f"No phone response: {e}")
+
+    async def collect(self) -> Dict[str, Any]:
+        captured = {}
+        for response in self.responses:
+            try:
+                captured[response.url] = await response.json()
+            except (AsyncPlaywrightError, ValueError):
+                continue
+        self.clear()
+        return captured
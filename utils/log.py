@@ -1,12 +1,71 @@
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Set
 from loguru import logger
 
 
+_sinks: Set[str] = set()
+_sinks_lock = threading.Lock()
+
+# Console output goes through a queue as well, the caller never waits
+# for the terminal
+logger.remove()
+logger.add(sys.stderr, enqueue=True)
+
+
 def get_logger(name: str, rotation="5 MB") -> logger:
-    logger.add(
-        f"./logs/{name}.log",
-        format="{time} {level} {name}:{function}:{line} {message}"
-    )
-    return logger
+    """
+    Returns the logger bound to `name`. The first call adds one queued
+    JSON lines sink ./logs/{name}.log that only receives records of
+    this name.
+    """
+    with _sinks_lock:
+        if name not in _sinks:
+            logger.add(
+                f"./logs/{name}.log",
+                filter=lambda record: record["extra"].get("logger") == name,
+                rotation=rotation,
+                enqueue=True,
+                serialize=True,
+            )
+            _sinks.add(name)
+    return logger.bind(logger=name)
+
+
+class RateLimitedLog:
+    """
+    Emits a repetitive message at most once per `interval` seconds for
+    each key, the next emitted line reports how many were suppressed.
+    """
+
+    def __init__(
+        self,
+        log: logger,
+        interval: float = 10.0,
+        level: str = "WARNING"
+    ) -> None:
+        self.log = log
+        self.interval = interval
+        self.level = level
+        self.last: Dict[str, float] = {}
+        self.suppressed: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, key: str, message: str) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last.get(key, -math.inf) < self.interval:
+                self.suppressed[key] += 1
+                return
+            self.last[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+
+        if suppressed:
+            message += f" ({suppressed} similar suppressed)"
+        self.log.opt(depth=1).log(self.level, message)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from typing import Dict, Literal, Optional
+
+import redis
+
+from utils.cache import AsyncCache, Cache
+from utils.log import RateLimitedLog, get_logger
+import envs
+
+
+rate_logger = get_logger("RateLimit")
+redis_warning = RateLimitedLog(rate_logger, interval=60)
+
+Endpoint = Literal["list", "detail", "phone"]
+# After a Redis error fetchers run unthrottled for this long instead of
+# paying a connection timeout on every request
+RETRY_AFTER = 30.0
+
+# Reserves `requested` tokens and returns how long the caller has to wait
+# before using them. Tokens may go negative, so callers queue up in the
+# order they reserved instead of retrying. Redis TIME keeps one clock for
+# every worker.
+TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+tokens = tokens - requested
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil((capacity - tokens) / rate * 1000))
+
+if tokens >= 0 then
+    return "0"
+end
+return tostring(-tokens / rate)
+"""
+
+
+def budgets() -> Dict[str, float]:
+    return {
+        "list": envs.RATE_LIMIT_LIST,
+        "detail": envs.RATE_LIMIT_DETAIL,
+        "phone": envs.RATE_LIMIT_PHONE,
+    }
+
+
+class RateLimiter:
+    """
+    Cluster-wide token buckets, one per endpoint, shared by every
+    process through Redis. Rates are requests per second, bursts of up to
+    RATE_LIMIT_BURST seconds worth of tokens are allowed.
+    """
+
+    def __init__(self, cache: Optional[Cache] = None) -> None:
+        self.red = (cache or Cache(envs.REDIS_DB)).red
+        self.script = self.red.register_script(TOKEN_BUCKET)
+        self.budgets = budgets()
+        self.retry_at = 0.0
+
+    def reserve(self, endpoint: Endpoint) -> float:
+        if time.monotonic() < self.retry_at:
+            return 0.0
+
+        rate = self.budgets[endpoint]
+        try:
+            return float(
+                self.script(
+                    keys=[f"rate_limit:{endpoint}"],
+                    args=[rate, rate * envs.RATE_LIMIT_BURST, 1],
+                )
+            )
+        except redis.RedisError as e:
+            redis_warning("redis", f"Rate limiter unavailable: {e}")
+            self.retry_at = time.monotonic() + RETRY_AFTER
+            return 0.0
+
+    def acquire(self, endpoint: Endpoint) -> None:
+        wait = self.reserve(endpoint)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AsyncRateLimiter:
+    def __init__(self, cache: Optional[AsyncCache] = None) -> None:
+        self.red = (cache or AsyncCache(envs.REDIS_DB)).red
+        self.script = self.red.register_script(TOKEN_BUCKET)
+        self.budgets = budgets()
+        self.retry_at = 0.0
+
+    async def reserve(self, endpoint: Endpoint) -> float:
+        if time.monotonic() < self.retry_at:
+            return 0.0
+
+        rate = self.budgets[endpoint]
+        try:
+            return float(
+                await self.script(
+                    keys=[f"rate_limit:{endpoint}"],
+                    args=[rate, rate * envs.RATE_LIMIT_BURST, 1],
+                )
+            )
+        except redis.RedisError as e:
+            redis_warning("redis", f"Rate limiter unavailable: {e}")
+            self.retry_at = time.monotonic() + RETRY_AFTER
+            return 0.0
+
+    async def acquire(self, endpoint: Endpoint) -> None:
+        wait = await self.reserve(endpoint)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_limiter: Optional[RateLimiter] = None
+_async_limiters: Dict[int, AsyncRateLimiter] = {}
+
+
+def throttle(endpoint: Endpoint) -> None:
+    global _limiter
+
+    if not envs.RATE_LIMIT_ENABLED:
+        return
+    if _limiter is None:
+        _limiter = RateLimiter()
+    _limiter.acquire(endpoint)
+
+
+async def async_throttle(endpoint: Endpoint) -> None:
+    if not envs.RATE_LIMIT_ENABLED:
+        return
+    # redis.asyncio connections belong to the loop that opened them
+    loop = id(asyncio.get_running_loop())
+    if loop not in _async_limiters:
+        _async_limiters.clear()
+        _async_limiters[loop] = AsyncRateLimiter()
+    await _async_limiters[loop].acquire(endpoint)
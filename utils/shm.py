@@ -0,0 +1,92 @@
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Deque, Dict, Optional
+import os
+import shutil
+
+from utils.exceptions import SharedMemoryException
+
+
+SHM_DIR = "/dev/shm"
+
+
+@dataclass
+class PageDescriptor:
+    buffer: str
+    slot: int
+    offset: int
+    length: int
+    url: str
+    encoding: Optional[str]
+
+
+class SharedRingBuffer:
+    """
+    Fixed-size slots in one shared memory block. The owning process
+    writes page bodies into free slots in place and passes PageDescriptors
+    to readers, which view the bytes without copying them.
+    """
+
+    def __init__(self, slots: int, slot_size: int) -> None:
+        self.slots = slots
+        self.slot_size = slot_size
+        check_free_space(slots * slot_size)
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=slots * slot_size
+        )
+        self.free: Deque[int] = deque(range(slots))
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def acquire(self) -> Optional[int]:
+        if not self.free:
+            return None
+        return self.free.popleft()
+
+    def release(self, slot: int) -> None:
+        self.free.append(slot)
+
+    def offset(self, slot: int) -> int:
+        return slot * self.slot_size
+
+    def write(self, slot: int, position: int, chunk: bytes) -> None:
+        start = self.offset(slot) + position
+        self.memory.buf[start:start + len(chunk)] = chunk
+
+    def close(self) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+
+def check_free_space(size: int) -> None:
+    """
+    The block is allocated lazily, a /dev/shm smaller than the block
+    only shows up as SIGBUS on the first write past its end.
+    """
+    if not os.path.isdir(SHM_DIR):
+        return
+    free = shutil.disk_usage(SHM_DIR).free
+    if free < size:
+        raise SharedMemoryException(
+            f"{SHM_DIR} has {free // 2 ** 20} MiB free, the ring buffer "
+            f"needs {size // 2 ** 20} MiB. Raise it (docker run "
+            f"--shm-size) or lower SHM_BUDGET"
+        )
+
+
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def read_page(descriptor: PageDescriptor) -> memoryview:
+    memory = _attached.get(descriptor.buffer)
+    if memory is None:
+        # Pool children share the owner's resource tracker, so attaching
+        # here does not register the block a second time
+        memory = shared_memory.SharedMemory(name=descriptor.buffer)
+        _attached[descriptor.buffer] = memory
+
+    start = descriptor.offset
+    return memory.buf[start:start + descriptor.length]
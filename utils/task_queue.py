@@ -0,0 +1,323 @@
+import json
+import os
+import socket
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from utils.cache import AsyncCache, Cache
+from utils.dto import Result, Task
+from utils.encoders import DateTimeEncoder, ObjectIdEncoder
+from utils.log import get_logger
+import envs
+
+
+queue_logger = get_logger("TaskQueue")
+
+TASKS_QUEUE = "tasks_queue"
+RESULTS_QUEUE = "results_queue"
+DONE_QUEUE = "done_queue"
+FAILED_QUEUE = "failed_queue"
+WORKERS = "workers"
+
+# Puts a task back into the queue with one more attempt on its payload,
+# or into the failed queue once it ran out of attempts. Returns 1 when
+# the task was requeued
+REQUEUE = """
+local function requeue(raw, queue, failed, max_attempts, push)
+    local task = cjson.decode(raw)
+    task.attempts = (task.attempts or 0) + 1
+    if task.attempts >= tonumber(max_attempts) then
+        redis.call("LPUSH", failed, cjson.encode(task))
+        return 0
+    end
+    redis.call(push, queue, cjson.encode(task))
+    return 1
+end
+"""
+
+# Moves the oldest task into the worker's processing list and leases it
+# in one step, the reaper never sees a claimed task without a lease
+CLAIM = """
+local raw = redis.call("LMOVE", KEYS[1], KEYS[2], "RIGHT", "LEFT")
+if not raw then
+    return false
+end
+local lease = "lease:" .. tostring(cjson.decode(raw).id)
+redis.call("SET", lease, ARGV[1], "PX", ARGV[2])
+return raw
+"""
+
+# Refreshes the worker key and the leases the worker still owns, returns
+# the ids of leases that expired and went to another worker. The worker
+# is added back to the set in case the reaper dropped it after a missed
+# heartbeat, otherwise its processing list would never be reaped again
+HEARTBEAT = """
+redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2])
+redis.call("SADD", KEYS[2], ARGV[1])
+local lost = {}
+for i = 3, #ARGV do
+    local lease = "lease:" .. ARGV[i]
+    if redis.call("GET", lease) == ARGV[1] then
+        redis.call("PEXPIRE", lease, ARGV[2])
+    else
+        table.insert(lost, ARGV[i])
+    end
+end
+return lost
+"""
+
+# Drops the task from the processing list with its lease, then pushes
+# the results followed by the done marker
+FINISH = """
+redis.call("LREM", KEYS[1], 1, ARGV[2])
+local lease = "lease:" .. tostring(cjson.decode(ARGV[2]).id)
+if redis.call("GET", lease) == ARGV[1] then
+    redis.call("DEL", lease)
+end
+for i = 4, #ARGV do
+    redis.call("LPUSH", KEYS[2], ARGV[i])
+end
+redis.call("LPUSH", KEYS[3], ARGV[3])
+return #ARGV - 3
+"""
+
+# Drops the task from the processing list with its lease and puts it
+# back into the queue. A failed attempt is counted unless ARGV[4] is
+# empty. Returns -1 for a task the reaper already requeued
+RELEASE = REQUEUE + """
+local removed = redis.call("LREM", KEYS[1], 1, ARGV[2])
+local lease = "lease:" .. tostring(cjson.decode(ARGV[2]).id)
+if redis.call("GET", lease) == ARGV[1] then
+    redis.call("DEL", lease)
+end
+if removed == 0 then
+    return -1
+end
+if ARGV[4] == "" then
+    redis.call("LPUSH", KEYS[2], ARGV[2])
+    return 1
+end
+return requeue(ARGV[2], KEYS[2], KEYS[3], ARGV[3], "LPUSH")
+"""
+
+# Returns tasks with expired leases to the head of the queue, counting
+# the attempt, and forgets a worker that stopped sending heartbeats once
+# its list is empty. Returns the requeued and the failed count
+REAP = REQUEUE + """
+local requeued, failed = 0, 0
+for _, raw in ipairs(redis.call("LRANGE", KEYS[1], 0, -1)) do
+    local lease = "lease:" .. tostring(cjson.decode(raw).id)
+    if redis.call("EXISTS", lease) == 0 then
+        redis.call("LREM", KEYS[1], 1, raw)
+        if requeue(raw, KEYS[2], KEYS[4], ARGV[2], "RPUSH") == 1 then
+            requeued = requeued + 1
+        else
+            failed = failed + 1
+        end
+    end
+end
+if redis.call("LLEN", KEYS[1]) == 0
+        and redis.call("EXISTS", "worker:" .. ARGV[1]) == 0 then
+    redis.call("SREM", KEYS[3], ARGV[1])
+end
+return {requeued, failed}
+"""
+
+
+def processing_key(worker_id: str) -> str:
+    return f"processing:{worker_id}"
+
+
+@dataclass
+class ClaimedTask:
+    task: Task
+    # The exact payload in the processing list, LREM needs it verbatim
+    raw: str
+    # Earlier attempts that failed or whose lease expired
+    attempts: int = 0
+
+
+class TaskQueue:
+    """
+    Orchestrator side of the reliable queue: pushes tasks, collects
+    results and done markers and returns tasks whose lease expired.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        max_attempts: int = envs.TASK_MAX_ATTEMPTS,
+    ) -> None:
+        self.red = (cache or Cache(envs.REDIS_DB)).red
+        self.max_attempts = max_attempts
+        self.reap_script = self.red.register_script(REAP)
+
+    def push(self, tasks: List[Task]) -> None:
+        if tasks:
+            self.red.lpush(
+                TASKS_QUEUE,
+                *(json.dumps(asdict(task), cls=ObjectIdEncoder)
+                  for task in tasks)
+            )
+
+    def pending(self) -> int:
+        return self.red.llen(TASKS_QUEUE)
+
+    def in_flight(self) -> Set[Any]:
+        """
+        Ids of tasks that are queued, claimed by a worker, done or failed
+        but not collected yet, they must not be handed out again on
+        restart.
+        """
+        ids = set()
+        for key in (
+            TASKS_QUEUE, FAILED_QUEUE,
+            *self.red.scan_iter(processing_key("*")),
+        ):
+            for raw in self.red.lrange(key, 0, -1):
+                ids.add(json.loads(raw)["id"])
+        for raw in self.red.lrange(DONE_QUEUE, 0, -1):
+            ids.add(json.loads(raw)["task_id"])
+        return ids
+
+    def pop_all(self, key: str) -> List[Dict[str, Any]]:
+        items = []
+        while True:
+            item = self.red.rpop(key)
+            if not item:
+                return items
+            items.append(json.loads(item))
+
+    def pop_results(self) -> List[Dict[str, Any]]:
+        return self.pop_all(RESULTS_QUEUE)
+
+    def pop_done(self) -> List[Dict[str, Any]]:
+        return self.pop_all(DONE_QUEUE)
+
+    def pop_failed(self) -> List[Dict[str, Any]]:
+        """Tasks that ran out of attempts, as their queue payload."""
+        return self.pop_all(FAILED_QUEUE)
+
+    def reap(self) -> int:
+        expired = 0
+        for worker_id in self.red.smembers(WORKERS):
+            requeued, failed = self.reap_script(
+                keys=[
+                    processing_key(worker_id), TASKS_QUEUE, WORKERS,
+                    FAILED_QUEUE,
+                ],
+                args=[worker_id, self.max_attempts],
+            )
+            if requeued:
+                queue_logger.warning(
+                    f"Requeued {requeued} tasks of worker {worker_id}, "
+                    f"lease expired"
+                )
+            if failed:
+                queue_logger.error(
+                    f"{failed} tasks of worker {worker_id} ran out of "
+                    f"attempts"
+                )
+            expired += requeued + failed
+        return expired
+
+
+class WorkerQueue:
+    """
+    Worker side of the reliable queue. Claimed tasks wait in
+    processing:{worker_id} under a lease of LEASE_TTL seconds, which
+    heartbeat() keeps alive until finish() or release().
+    """
+
+    def __init__(
+        self,
+        cache: Optional[AsyncCache] = None,
+        worker_id: Optional[str] = None,
+        lease_ttl: float = envs.LEASE_TTL,
+        max_attempts: int = envs.TASK_MAX_ATTEMPTS,
+    ) -> None:
+        self.red = (cache or AsyncCache(envs.REDIS_DB)).red
+        self.max_attempts = max_attempts
+        self.worker_id = (
+            worker_id or envs.WORKER_ID
+            or f"{socket.gethostname()}-{os.getpid()}"
+        )
+        self.processing = processing_key(self.worker_id)
+        self.ttl_ms = int(lease_ttl * 1000)
+        self.active: Dict[str, ClaimedTask] = {}
+
+        self.claim_script = self.red.register_script(CLAIM)
+        self.heartbeat_script = self.red.register_script(HEARTBEAT)
+        self.finish_script = self.red.register_script(FINISH)
+        self.release_script = self.red.register_script(RELEASE)
+
+    async def register(self) -> None:
+        await self.heartbeat()
+        queue_logger.info(f"Registered worker {self.worker_id}")
+
+    async def claim(self) -> Optional[ClaimedTask]:
+        raw = await self.claim_script(
+            keys=[TASKS_QUEUE, self.processing],
+            args=[self.worker_id, self.ttl_ms],
+        )
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        attempts = data.pop("attempts", 0)
+        claimed = ClaimedTask(Task(**data), raw, attempts)
+        self.active[str(claimed.task.id)] = claimed
+        return claimed
+
+    async def heartbeat(self) -> None:
+        lost = await self.heartbeat_script(
+            keys=[f"worker:{self.worker_id}", WORKERS],
+            args=[self.worker_id, self.ttl_ms, *self.active],
+        )
+        for task_id in lost:
+            queue_logger.warning(
+                f"Lease of task {task_id} expired, it was requeued"
+            )
+
+    async def finish(
+        self,
+        claimed: ClaimedTask,
+        results: List[Result],
+        empty: bool = False
+    ) -> None:
+        done = json.dumps(
+            {
+                "task_id": claimed.task.id,
+                "worker_id": self.worker_id,
+                "results": len(results),
+                "empty": empty,
+            },
+            cls=ObjectIdEncoder,
+        )
+        await self.finish_script(
+            keys=[self.processing, RESULTS_QUEUE, DONE_QUEUE],
+            args=[
+                self.worker_id, claimed.raw, done,
+                *(json.dumps(asdict(result), cls=DateTimeEncoder)
+                  for result in results),
+            ],
+        )
+        self.active.pop(str(claimed.task.id), None)
+
+    async def release(self, claimed: ClaimedTask, failed: bool = True) -> None:
+        """
+        Hands the task to another worker. A failed attempt counts towards
+        max_attempts, a task released on shutdown does not.
+        """
+        requeued = await self.release_script(
+            keys=[self.processing, TASKS_QUEUE, FAILED_QUEUE],
+            args=[
+                self.worker_id, claimed.raw, self.max_attempts,
+                "1" if failed else "",
+            ],
+        )
+        if requeued == 0:
+            queue_logger.error(
+                f"Task {claimed.task.id} failed "
+                f"{claimed.attempts + 1} times, giving up"
+            )
+        self.active.pop(str(claimed.task.id), None)